@@ -0,0 +1,190 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Default delivery settings
+ALERT_OUTBOX_PATH = os.getenv("FLOOD_ALERT_OUTBOX", "flood_alerts_outbox.db")
+ALERT_DEDUP_WINDOW = float(os.getenv("FLOOD_ALERT_DEDUP_WINDOW", "600"))  # seconds per location
+ALERT_TIMEOUT = (3.05, 10)  # (connect, read) seconds
+ALERT_MAX_ATTEMPTS = 8
+ALERT_RETRY_BASE_DELAY = 2.0  # seconds, doubled after every failed attempt
+ALERT_RETRY_MAX_DELAY = 300.0
+
+class AlertDispatcher:
+    """Delivers flood alerts from a background worker so the frame loop never waits on HTTP
+
+    Alerts are written to a SQLite outbox before delivery and retried with exponential
+    backoff, so pending alerts survive a restart. Alerts for the same location inside
+    the dedup window are dropped.
+    """
+
+    def __init__(self, endpoint, outbox_path=ALERT_OUTBOX_PATH, dedup_window=ALERT_DEDUP_WINDOW):
+        self.endpoint = endpoint
+        self.outbox_path = outbox_path
+        self.dedup_window = dedup_window
+
+        # In-memory handoff from the frame loop; only the worker touches the outbox
+        self.incoming = queue.Queue()
+        self.callbacks = {}
+        self.last_enqueued = {}
+        self.dedup_lock = threading.Lock()
+
+        self.worker_thread = None
+        self.worker_lock = threading.Lock()
+
+        # Delivery counters for status reporting
+        self.attempts = 0
+        self.failures = 0
+
+    def start(self):
+        """Start the delivery worker if it is not already running"""
+        with self.worker_lock:
+            if self.worker_thread is None or not self.worker_thread.is_alive():
+                self.worker_thread = threading.Thread(target=self.worker, daemon=True)
+                self.worker_thread.start()
+
+    def enqueue(self, location, callback=None):
+        """Queue an alert for delivery. Returns False if it was deduplicated.
+
+        callback(location, status) is called from the worker with "sent" once the alert is
+        delivered, "failed" once it has run out of retries, or "deduplicated" if the outbox
+        already holds a recent alert for the location (nothing is sent for this one).
+        """
+        now = time.time()
+        with self.dedup_lock:
+            last = self.last_enqueued.get(location)
+            if last is not None and now - last < self.dedup_window:
+                return False
+            self.last_enqueued[location] = now
+
+        self.incoming.put((location, now, callback))
+        return True
+
+    def connect(self):
+        """Open the outbox database and make sure the table exists"""
+        db = sqlite3.connect(self.outbox_path)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                location TEXT NOT NULL,
+                created REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt REAL NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                last_error TEXT
+            )
+        """)
+        db.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, next_attempt)")
+        db.commit()
+        return db
+
+    def create_session(self):
+        """Pooled HTTP session reused for every delivery"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def store_incoming(self, db, location, created, callback):
+        """Persist a queued alert unless one for the location was recently stored"""
+        # The in-memory check doesn't survive restarts, so check the outbox as well
+        duplicate = db.execute(
+            "SELECT 1 FROM outbox WHERE location = ? AND created > ? AND status != 'failed' LIMIT 1",
+            (location, created - self.dedup_window)
+        ).fetchone()
+        if duplicate:
+            print(f"Skipping duplicate flood alert for {location}")
+            if callback is not None:
+                callback(location, "deduplicated")
+            return
+
+        cursor = db.execute(
+            "INSERT INTO outbox (location, created, next_attempt) VALUES (?, ?, ?)",
+            (location, created, created)
+        )
+        db.commit()
+        if callback is not None:
+            self.callbacks[cursor.lastrowid] = callback
+
+    def deliver(self, db, session, alert_id, location, attempts):
+        """Try to deliver one alert and record the outcome in the outbox"""
+        self.attempts += 1
+        error = None
+        try:
+            response = session.get(self.endpoint, params={"location": location}, timeout=ALERT_TIMEOUT)
+            if response.status_code == 200:
+                print(f"Notification successfully sent for location: {location}")
+            else:
+                error = f"status code {response.status_code}"
+        except requests.RequestException as e:
+            error = str(e)
+
+        attempts += 1
+        if error is None:
+            db.execute("UPDATE outbox SET status = 'sent', attempts = ? WHERE id = ?", (attempts, alert_id))
+        elif attempts >= ALERT_MAX_ATTEMPTS:
+            self.failures += 1
+            print(f"Giving up on flood alert for {location} after {attempts} attempts: {error}")
+            db.execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                       (attempts, error, alert_id))
+        else:
+            self.failures += 1
+            delay = min(ALERT_RETRY_BASE_DELAY * 2 ** (attempts - 1), ALERT_RETRY_MAX_DELAY)
+            delay *= random.uniform(0.8, 1.2)
+            print(f"Failed to send notification for {location} ({error}). Retrying in {delay:.1f}s.")
+            db.execute("UPDATE outbox SET attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                       (attempts, time.time() + delay, error, alert_id))
+            db.commit()
+            return
+
+        db.commit()
+        callback = self.callbacks.pop(alert_id, None)
+        if callback is not None:
+            callback(location, "sent" if error is None else "failed")
+
+    def worker(self):
+        """Move queued alerts into the outbox and deliver whatever is due"""
+        db = self.connect()
+        session = self.create_session()
+
+        while True:
+            # Deliver everything that is due, oldest first
+            now = time.time()
+            due = db.execute(
+                "SELECT id, location, attempts FROM outbox WHERE status = 'pending' AND next_attempt <= ? "
+                "ORDER BY next_attempt",
+                (now,)
+            ).fetchall()
+            for alert_id, location, attempts in due:
+                self.deliver(db, session, alert_id, location, attempts)
+
+            # Sleep until the next retry is due or a new alert arrives
+            row = db.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'").fetchone()
+            timeout = ALERT_RETRY_MAX_DELAY if row[0] is None else max(0.0, row[0] - time.time())
+            try:
+                item = self.incoming.get(timeout=timeout)
+            except queue.Empty:
+                continue
+
+            while item is not None:
+                self.store_incoming(db, *item)
+                try:
+                    item = self.incoming.get_nowait()
+                except queue.Empty:
+                    item = None
+
+    def stats(self):
+        """Delivery counters for /flood_status"""
+        return {
+            "queued": self.incoming.qsize(),
+            "attempts": self.attempts,
+            "failures": self.failures
+        }
@@ -0,0 +1,300 @@
+"""Offline scan of archived footage for past flood events.
+
+Walks a directory of videos, samples every --stride-th frame and runs the flood model on
+the samples in batches across a pool of worker processes (one model per worker, the CPU
+threads split between them). Long videos are cut into segments so a few big files still
+keep every core busy. Flood detections closer together than --episode-gap seconds are
+merged into episodes and written as one JSON line each:
+
+    {"video": ..., "start": 12.4, "end": 31.0, "duration": 18.6, "class": "flood",
+     "confidence": 0.91, "peak_time": 20.2, "bbox": [x1, y1, x2, y2], "detections": 14}
+
+    python flood_archive_scan.py /data/footage --output flood_index.jsonl
+    python flood_archive_scan.py /data/footage --stride 30 --workers 16 --parquet flood_index.parquet
+
+Finished videos are appended to a checkpoint file, so an interrupted scan picks up where
+it stopped when run again with the same output.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+
+from flood_backends import BACKENDS, DEFAULT_IMGSZ
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".m4v", ".mpg", ".mpeg", ".ts", ".webm")
+SEGMENT_SECONDS = 600  # videos are split into segments of this length for the pool
+DEFAULT_FPS = 25.0  # used when a file does not report its frame rate
+
+# Set in every worker process by init_worker
+worker_model = None
+worker_flood_classes = None
+
+def init_worker(backend, weights, imgsz, threads):
+    """Load the model once per worker process"""
+    global worker_model, worker_flood_classes
+
+    os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+    import cv2
+    import torch
+
+    import flood_backends
+    from flood_overlay import flood_class_ids
+
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+    flood_backends.ONNX_INTRA_OP_THREADS = threads
+    worker_model = flood_backends.load_backend(backend, weights, imgsz)
+    worker_flood_classes = flood_class_ids(worker_model.names)
+
+def scan_segment(task):
+    """Flood detections on the sampled frames of one video segment
+
+    Returns (video, segment index, list of hits, error message or None); a hit is the most
+    confident flood box of a sampled frame.
+    """
+    import cv2
+    import numpy as np
+
+    from flood_overlay import extract_detections
+
+    video, index, start_frame, end_frame, fps, stride, batch_size, conf = task
+    hits = []
+
+    def run_batch(frames, frame_numbers):
+        for frame_number, result in zip(frame_numbers, worker_model(frames, conf=conf)):
+            boxes, confidences, class_ids = extract_detections(result)
+            flood_mask = np.isin(class_ids, worker_flood_classes)
+            if not flood_mask.any():
+                continue
+            best = int(np.argmax(np.where(flood_mask, confidences, -1.0)))
+            hits.append({
+                "time": round(frame_number / fps, 3),
+                "class": worker_model.names[int(class_ids[best])],
+                "confidence": round(float(confidences[best]), 4),
+                "bbox": [round(float(value), 1) for value in boxes[best]]
+            })
+
+    cap = cv2.VideoCapture(video)
+    try:
+        if not cap.isOpened():
+            return video, index, hits, "could not open video"
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        frames = []
+        frame_numbers = []
+        frame_number = start_frame
+        while end_frame is None or frame_number < end_frame:
+            # grab() skips frames between samples without decoding them
+            if not cap.grab():
+                break
+            if (frame_number - start_frame) % stride == 0:
+                success, frame = cap.retrieve()
+                if success:
+                    frames.append(frame)
+                    frame_numbers.append(frame_number)
+                if len(frames) == batch_size:
+                    run_batch(frames, frame_numbers)
+                    frames, frame_numbers = [], []
+            frame_number += 1
+        if frames:
+            run_batch(frames, frame_numbers)
+    except Exception as e:
+        return video, index, hits, f"{type(e).__name__}: {e}"
+    finally:
+        cap.release()
+    return video, index, hits, None
+
+def find_videos(directory):
+    """Every video file under directory, in a stable order"""
+    videos = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                videos.append(os.path.join(root, name))
+    return sorted(videos)
+
+def video_segments(video, segment_seconds):
+    """(start frame, end frame or None, fps) of each segment of a video"""
+    import cv2
+
+    cap = cv2.VideoCapture(video)
+    fps = cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    # Without a reliable frame count the whole file is one segment
+    if frame_count <= 0:
+        return [(0, None, fps)]
+    segment_frames = max(1, int(segment_seconds * fps))
+    return [(start, min(start + segment_frames, frame_count), fps) for start in range(0, frame_count, segment_frames)]
+
+def build_episodes(video, hits, episode_gap, stride_seconds):
+    """Merge time-ordered hits into episodes separated by more than episode_gap seconds"""
+    episodes = []
+    episode = None
+    for hit in sorted(hits, key=lambda hit: hit["time"]):
+        if episode is not None and hit["time"] - episode["end"] <= episode_gap:
+            episode["end"] = hit["time"]
+            episode["detections"] += 1
+            if hit["confidence"] > episode["confidence"]:
+                episode["class"] = hit["class"]
+                episode["confidence"] = hit["confidence"]
+                episode["peak_time"] = hit["time"]
+                episode["bbox"] = hit["bbox"]
+            continue
+        episode = {"video": video, "start": hit["time"], "end": hit["time"], "class": hit["class"],
+                   "confidence": hit["confidence"], "peak_time": hit["time"], "bbox": hit["bbox"], "detections": 1}
+        episodes.append(episode)
+
+    for episode in episodes:
+        # A sample stands for the stride of frames after it
+        episode["end"] = round(episode["end"] + stride_seconds, 3)
+        episode["duration"] = round(episode["end"] - episode["start"], 3)
+    return episodes
+
+def file_signature(video):
+    stat = os.stat(video)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+def load_checkpoint(checkpoint_path):
+    """Videos finished by earlier runs, keyed by path, with the signature they had then"""
+    done = {}
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partial line from an interrupted write
+                done[entry["video"]] = entry
+    return done
+
+def drop_unfinished(output_path, done):
+    """Remove rows of videos that were written but never checkpointed (interrupted mid-way)"""
+    if not os.path.exists(output_path):
+        return
+    kept = []
+    with open(output_path) as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if row.get("video") in done:
+                kept.append(line if line.endswith("\n") else line + "\n")
+    temp_path = output_path + ".tmp"
+    with open(temp_path, "w") as f:
+        f.writelines(kept)
+    os.replace(temp_path, output_path)
+
+def write_parquet(output_path, parquet_path):
+    """Convert the JSONL index to Parquet (needs pyarrow)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Error: --parquet needs pyarrow (pip install pyarrow)")
+
+    with open(output_path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    pq.write_table(pa.Table.from_pylist(rows), parquet_path)
+    print(f"Wrote {len(rows)} episodes to {parquet_path}")
+
+def scan(args):
+    """Scan every pending video and append its episodes to the index"""
+    checkpoint_path = args.checkpoint or args.output + ".checkpoint"
+    done = load_checkpoint(checkpoint_path)
+
+    videos = []
+    for video in find_videos(args.directory):
+        previous = done.get(video)
+        signature = file_signature(video)
+        if previous and previous["size"] == signature["size"] and previous["mtime"] == signature["mtime"]:
+            continue
+        # Files changed since they were scanned lose their old rows and are scanned again
+        done.pop(video, None)
+        videos.append(video)
+    drop_unfinished(args.output, done)
+    print(f"{len(videos)} videos to scan ({len(done)} already done according to {checkpoint_path})")
+    if not videos:
+        return
+
+    tasks = []
+    pending = {}  # video -> [segments still running, hits so far, fps]
+    for video in videos:
+        segments = video_segments(video, args.segment_seconds)
+        pending[video] = [len(segments), [], segments[0][2]]
+        for index, (start, end, fps) in enumerate(segments):
+            tasks.append((video, index, start, end, fps, args.stride, args.batch, args.conf))
+
+    workers = min(args.workers, len(tasks))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Scanning {len(tasks)} segments with {workers} workers ({threads} threads each)")
+
+    start_time = time.time()
+    finished = 0
+    failed = set()
+    # spawn: workers start clean instead of inheriting this process' torch/OpenCV threads
+    context = mp.get_context("spawn")
+    with context.Pool(workers, initializer=init_worker,
+                      initargs=(args.backend, args.weights, args.imgsz, threads)) as pool, \
+            open(args.output, "a") as output, open(checkpoint_path, "a") as checkpoint:
+        for video, index, hits, error in pool.imap_unordered(scan_segment, tasks):
+            state = pending[video]
+            state[0] -= 1
+            state[1].extend(hits)
+            if error:
+                print(f"Error scanning {video} segment {index}: {error}")
+                failed.add(video)
+            if state[0]:
+                continue
+
+            del pending[video]
+            finished += 1
+            if video in failed:
+                continue  # not checkpointed, so the next run scans it again
+
+            episodes = build_episodes(video, state[1], args.episode_gap, args.stride / state[2])
+            for episode in episodes:
+                output.write(json.dumps(episode) + "\n")
+            output.flush()
+            os.fsync(output.fileno())
+            # Checkpoint only after the episodes are on disk
+            checkpoint.write(json.dumps({"video": video, **file_signature(video), "episodes": len(episodes)}) + "\n")
+            checkpoint.flush()
+            print(f"[{finished}/{len(videos)}] {video}: {len(episodes)} episodes "
+                  f"({time.time() - start_time:.0f}s elapsed)")
+
+    if failed:
+        print(f"{len(failed)} videos failed and will be retried on the next run")
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan a directory of archived videos for flood episodes")
+    parser.add_argument("directory")
+    parser.add_argument("--output", default="flood_index.jsonl", help="JSONL index of episodes (appended to)")
+    parser.add_argument("--checkpoint", help="finished-video log (default: <output>.checkpoint)")
+    parser.add_argument("--parquet", help="also write the whole index to this Parquet file (needs pyarrow)")
+    parser.add_argument("--weights", default="best.pt")
+    parser.add_argument("--backend", choices=BACKENDS, default="ultralytics")
+    parser.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--stride", type=int, default=15, help="run the model on every Nth frame")
+    parser.add_argument("--batch", type=int, default=8, help="sampled frames per model call")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--segment-seconds", type=float, default=SEGMENT_SECONDS,
+                        help="split videos into segments of this length")
+    parser.add_argument("--episode-gap", type=float, default=5.0,
+                        help="seconds without a flood detection that end an episode")
+    args = parser.parse_args()
+    if args.stride < 1 or args.batch < 1 or args.workers < 1:
+        parser.error("--stride, --batch and --workers must be at least 1")
+
+    scan(args)
+    if args.parquet and os.path.exists(args.output):
+        write_parquet(args.output, args.parquet)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""Inference backends for the flood YOLO model.
+
+Every backend is called like an ultralytics model, backend(frames, conf=0.25), and returns
+one ultralytics Results object per frame, so the detection loop doesn't care which runtime
+is underneath:
+
+    ultralytics  PyTorch weights through ultralytics (the original behaviour)
+    onnx         ONNX Runtime with tuned CPU thread settings
+    onnx-int8    ONNX Runtime on a dynamically INT8-quantized copy of the ONNX export
+    openvino     OpenVINO export, run through ultralytics' OpenVINO loader
+
+Exports are created next to the .pt weights the first time a backend needs them.
+
+Command line:
+    python flood_backends.py export --backend onnx
+    python flood_backends.py benchmark --video vid.mp4 --backends ultralytics,onnx
+"""
+import argparse
+import ast
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Force CPU usage since CUDA libraries are missing
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+
+from ultralytics import YOLO
+from ultralytics.engine.results import Results
+
+BACKENDS = ["ultralytics", "onnx", "onnx-int8", "openvino"]
+DEFAULT_IMGSZ = 640
+WARMUP_RUNS = 3
+
+# ONNX Runtime threading: one intra-op pool sized to the machine, no inter-op parallelism
+ONNX_INTRA_OP_THREADS = int(os.getenv("FLOOD_ONNX_THREADS", str(os.cpu_count() or 1)))
+ONNX_INTER_OP_THREADS = 1
+
+# Post-processing limits, matching the ultralytics defaults
+NMS_IOU_THRESHOLD = 0.45
+MAX_DETECTIONS = 300
+MAX_BOX_SIZE = 7680  # class offset used to run per-class NMS in one call
+
+class UltralyticsBackend:
+    """PyTorch (or any ultralytics-loadable export) through the ultralytics predictor"""
+
+    def __init__(self, weights, imgsz=DEFAULT_IMGSZ):
+        self.model = YOLO(weights)
+        self.names = self.model.names
+        self.imgsz = imgsz
+
+    def __call__(self, frames, conf=0.25, imgsz=None):
+        # verbose=False: the per-frame console summary costs more than it is worth in a video loop
+        return self.model(frames, conf=conf, imgsz=imgsz or self.imgsz, verbose=False)
+
+class OnnxBackend:
+    """ONNX Runtime session with letterbox pre-processing and NMS post-processing"""
+
+    def __init__(self, onnx_path, imgsz=DEFAULT_IMGSZ):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+        options.inter_op_num_threads = ONNX_INTER_OP_THREADS
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = imgsz
+
+        # ultralytics stores the class names in the model metadata
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+
+    def letterbox(self, frame, imgsz):
+        """Resize keeping the aspect ratio and pad to a square input; returns (image, scale, pad)"""
+        height, width = frame.shape[:2]
+        scale = min(imgsz / height, imgsz / width)
+        new_width, new_height = int(round(width * scale)), int(round(height * scale))
+        pad_x, pad_y = (imgsz - new_width) / 2, (imgsz - new_height) / 2
+
+        resized = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+        top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+        bottom, right = imgsz - new_height - top, imgsz - new_width - left
+        padded = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+        return padded, scale, (left, top)
+
+    def postprocess(self, prediction, conf, scale, pad, frame_shape):
+        """Turn one raw (4 + classes, anchors) output into an (N, 6) xyxy/conf/cls array"""
+        prediction = prediction.T
+        class_scores = prediction[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+
+        keep = scores > conf
+        if not keep.any():
+            return np.zeros((0, 6), dtype=np.float32)
+        boxes, scores, class_ids = prediction[keep, :4], scores[keep], class_ids[keep]
+
+        # cx, cy, w, h -> x1, y1, x2, y2 in original image coordinates
+        xyxy = np.empty_like(boxes)
+        xyxy[:, 0] = boxes[:, 0] - boxes[:, 2] / 2
+        xyxy[:, 1] = boxes[:, 1] - boxes[:, 3] / 2
+        xyxy[:, 2] = boxes[:, 0] + boxes[:, 2] / 2
+        xyxy[:, 3] = boxes[:, 1] + boxes[:, 3] / 2
+        xyxy[:, [0, 2]] = (xyxy[:, [0, 2]] - pad[0]) / scale
+        xyxy[:, [1, 3]] = (xyxy[:, [1, 3]] - pad[1]) / scale
+        xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, frame_shape[1])
+        xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, frame_shape[0])
+
+        indices = batched_nms(xyxy, scores, class_ids, conf, NMS_IOU_THRESHOLD)[:MAX_DETECTIONS]
+
+        return np.column_stack([xyxy[indices], scores[indices], class_ids[indices]]).astype(np.float32)
+
+    def __call__(self, frames, conf=0.25, imgsz=None):
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+        imgsz = imgsz or self.imgsz
+
+        batch = []
+        transforms = []
+        for frame in frames:
+            padded, scale, pad = self.letterbox(frame, imgsz)
+            batch.append(padded)
+            transforms.append((scale, pad))
+
+        # BGR HWC uint8 -> RGB NCHW float32 in [0, 1]
+        blob = np.ascontiguousarray(np.stack(batch)[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32)
+        blob /= 255.0
+        outputs = self.session.run(None, {self.input_name: blob})[0]
+
+        results = []
+        for frame, prediction, (scale, pad) in zip(frames, outputs, transforms):
+            boxes = self.postprocess(prediction, conf, scale, pad, frame.shape)
+            results.append(Results(orig_img=frame, path="", names=self.names, boxes=boxes))
+        return results
+
+def export_path(weights, backend):
+    """Where the export for a backend lives next to the .pt weights"""
+    stem = os.path.splitext(weights)[0]
+    if backend == "onnx":
+        return f"{stem}.onnx"
+    if backend == "onnx-int8":
+        return f"{stem}.int8.onnx"
+    if backend == "openvino":
+        return f"{stem}_openvino_model"
+    return weights
+
+def export_model(weights, backend, imgsz=DEFAULT_IMGSZ):
+    """Export the .pt weights for a backend once and return the exported path"""
+    path = export_path(weights, backend)
+    if backend == "ultralytics" or os.path.exists(path):
+        return path
+
+    print(f"Exporting {weights} for the {backend} backend...")
+    if backend == "onnx":
+        # Dynamic axes so frames from several cameras can be batched and imgsz can change
+        YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    elif backend == "onnx-int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        onnx_path = export_model(weights, "onnx", imgsz)
+        quantize_dynamic(onnx_path, path, weight_type=QuantType.QUInt8)
+    elif backend == "openvino":
+        YOLO(weights).export(format="openvino", imgsz=imgsz)
+    else:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose from {', '.join(BACKENDS)}")
+    return path
+
+def load_backend(backend, weights, imgsz=DEFAULT_IMGSZ, warmup=True):
+    """Create an inference backend, exporting the weights first if needed"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose from {', '.join(BACKENDS)}")
+
+    path = export_model(weights, backend, imgsz)
+    if backend in ("onnx", "onnx-int8"):
+        model = OnnxBackend(path, imgsz)
+    else:
+        model = UltralyticsBackend(path, imgsz)
+
+    # Pay for lazy initialisation and allocator growth before the first real frame
+    if warmup:
+        dummy = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+        for _ in range(WARMUP_RUNS):
+            model([dummy], conf=0.25)
+    print(f"Loaded {backend} inference backend from {path}")
+    return model
+
+def batched_nms(boxes, scores, class_ids, score_threshold, iou_threshold):
+    """Indices of the xyxy boxes kept by per-class NMS, best score first
+
+    Each class is shifted into its own region of the plane, so one NMS call never
+    suppresses a box with a box of another class.
+    """
+    shifted = boxes + class_ids[:, None] * MAX_BOX_SIZE
+    rects = np.column_stack([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]])
+    indices = cv2.dnn.NMSBoxes(rects.tolist(), scores.tolist(), score_threshold, iou_threshold)
+    return np.array(indices, dtype=np.int64).reshape(-1)
+
+def box_iou(a, b):
+    """Pairwise IoU between two (N, 4) and (M, 4) xyxy arrays"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+def detection_agreement(reference, candidate, iou_threshold=0.5):
+    """F1 score of candidate detections against reference ones (same class, IoU >= threshold)"""
+    if len(reference) == 0 and len(candidate) == 0:
+        return 1.0
+    if len(reference) == 0 or len(candidate) == 0:
+        return 0.0
+
+    iou = box_iou(reference[:, :4], candidate[:, :4])
+    iou[reference[:, 5][:, None] != candidate[:, 5][None, :]] = 0.0
+
+    # Greedy one-to-one matching, best overlaps first
+    matches = 0
+    for _ in range(min(len(reference), len(candidate))):
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        if iou[i, j] < iou_threshold:
+            break
+        matches += 1
+        iou[i, :] = 0.0
+        iou[:, j] = 0.0
+    return 2 * matches / (len(reference) + len(candidate))
+
+def read_frames(video, max_frames):
+    """Decode up to max_frames frames of a video into memory"""
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < max_frames:
+        success, frame = cap.read()
+        if not success:
+            break
+        frames.append(frame)
+    cap.release()
+    if not frames:
+        raise SystemExit(f"Error: Could not read any frames from {video}")
+    return frames
+
+def benchmark(args):
+    """Compare per-frame latency and detection agreement between backends"""
+    frames = read_frames(args.video, args.frames)
+    names = args.backends.split(",")
+
+    report = {"video": args.video, "frames": len(frames), "imgsz": args.imgsz, "backends": {}}
+    reference = None
+    for name in names:
+        model = load_backend(name, args.weights, args.imgsz)
+        latencies = []
+        detections = []
+        for frame in frames:
+            start = time.perf_counter()
+            result = model([frame], conf=args.conf)[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+            detections.append(result.boxes.data.cpu().numpy() if hasattr(result.boxes.data, "cpu")
+                              else np.asarray(result.boxes.data))
+
+        latencies = np.array(latencies)
+        entry = {
+            "mean_ms": round(float(latencies.mean()), 2),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            "fps": round(1000.0 / float(latencies.mean()), 2),
+            "detections": int(sum(len(d) for d in detections))
+        }
+
+        # The first backend in the list is the reference for agreement
+        if reference is None:
+            reference = detections
+        else:
+            scores = [detection_agreement(r, c) for r, c in zip(reference, detections)]
+            entry["agreement_f1"] = round(float(np.mean(scores)), 4)
+        report["backends"][name] = entry
+
+    print(json.dumps(report, indent=2))
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and benchmark flood model inference backends")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="export best.pt for a backend")
+    export_parser.add_argument("--backend", choices=BACKENDS[1:], default="onnx")
+    export_parser.add_argument("--weights", default="best.pt")
+    export_parser.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ)
+
+    benchmark_parser = subparsers.add_parser("benchmark", help="compare backends on a video")
+    benchmark_parser.add_argument("--video", default="vid.mp4")
+    benchmark_parser.add_argument("--weights", default="best.pt")
+    benchmark_parser.add_argument("--backends", default="ultralytics,onnx",
+                                  help="comma separated; the first one is the agreement reference")
+    benchmark_parser.add_argument("--frames", type=int, default=200)
+    benchmark_parser.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ)
+    benchmark_parser.add_argument("--conf", type=float, default=0.25)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        print(export_model(args.weights, args.backend, args.imgsz))
+    else:
+        benchmark(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Headless benchmark of the flood detection pipeline.
+
+Runs the same stages as the detection loop on a video file, without Flask, cameras or
+the notification endpoint, and reports per-stage latency percentiles, overall FPS and
+peak RSS as JSON:
+
+    python flood_benchmark.py --video vid.mp4 --output baseline.json
+    python flood_benchmark.py --video vid.mp4 --compare baseline.json
+
+With --compare the exit status is 1 when any stage's p50/p95 latency or the overall FPS
+regressed by more than --tolerance percent, so it can gate changes locally.
+
+--roi (polygons as JSON, or a JSON file) and --tile-size run the model on the masked crop
+and its tiles like a source configured with them; the inference stage then includes the
+cropping and the NMS merge, and the detection counts in the report show what the ROI or
+tiling gained or lost:
+
+    python flood_benchmark.py --video vid.mp4 --roi "[[[0, 0.4], [1, 0.4], [1, 1], [0, 1]]]" --tile-size 640
+"""
+import argparse
+import json
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from flood_backends import BACKENDS, DEFAULT_IMGSZ, load_backend
+from flood_overlay import draw_detections, extract_detections, flood_class_ids
+from flood_roi import TILE_OVERLAP, RegionOfInterest
+
+STAGES = ["decode", "inference", "annotate", "put_text", "encode"]
+PERCENTILES = [50, 95, 99]
+
+def summarize(samples):
+    """Latency percentiles in milliseconds"""
+    samples = np.array(samples) * 1000
+    summary = {f"p{p}_ms": round(float(np.percentile(samples, p)), 3) for p in PERCENTILES}
+    summary["mean_ms"] = round(float(samples.mean()), 3)
+    return summary
+
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def load_polygons(value):
+    """ROI polygons from a JSON string or a JSON file"""
+    if value is None:
+        return None
+    if value.lstrip().startswith("["):
+        return json.loads(value)
+    with open(value) as f:
+        return json.load(f)
+
+def run_pipeline(args):
+    """Time every stage of the pipeline over the video and return the report"""
+    model = load_backend(args.backend, args.weights, args.imgsz)
+    flood_classes = flood_class_ids(model.names)
+    polygons = load_polygons(args.roi)
+    roi = RegionOfInterest(polygons, args.tile_size, args.tile_overlap) if polygons or args.tile_size else None
+
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        raise SystemExit(f"Error: Could not open video file {args.video}")
+
+    timings = {stage: [] for stage in STAGES}
+    frames = 0
+    total_detections = 0
+    flood_detections = 0
+    start = time.perf_counter()
+
+    while frames < args.frames:
+        t0 = time.perf_counter()
+        success, frame = cap.read()
+        t1 = time.perf_counter()
+        if not success:
+            break
+
+        if roi is not None:
+            boxes, confidences, class_ids = roi.merge(model(roi.prepare(frame), conf=args.conf))
+        else:
+            results = model(frame, conf=args.conf)
+            boxes, confidences, class_ids = extract_detections(results[0])
+        t2 = time.perf_counter()
+
+        flood_mask = np.isin(class_ids, flood_classes)
+        if args.overlay == "plot":
+            annotated_frame = results[0].plot()
+        else:
+            annotated_frame = draw_detections(frame, boxes, confidences, class_ids, model.names, flood_mask)
+        detections = len(class_ids)
+        total_detections += detections
+        flood_detections += int(flood_mask.sum())
+        t3 = time.perf_counter()
+
+        height = frame.shape[0]
+        cv2.putText(annotated_frame, f"Detections: {detections}", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        cv2.putText(annotated_frame, "Alert pending", (10, height - 20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        t4 = time.perf_counter()
+
+        cv2.imencode('.jpg', annotated_frame)
+        t5 = time.perf_counter()
+
+        for stage, elapsed in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4)):
+            timings[stage].append(elapsed)
+        frames += 1
+
+    elapsed = time.perf_counter() - start
+    cap.release()
+    if frames == 0:
+        raise SystemExit(f"Error: Could not read any frames from {args.video}")
+
+    return {
+        "video": args.video,
+        "backend": args.backend,
+        "imgsz": args.imgsz,
+        "overlay": args.overlay,
+        "roi": roi.stats() if roi is not None else None,
+        "frames": frames,
+        "detections": total_detections,
+        "flood_detections": flood_detections,
+        "fps": round(frames / elapsed, 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": {stage: summarize(samples) for stage, samples in timings.items()}
+    }
+
+def percent_change(new, old):
+    return round((new - old) / old * 100, 1) if old else 0.0
+
+def compare(report, baseline, tolerance):
+    """Diff a report against a baseline; returns (diff, list of regressions)"""
+    diff = {"fps": {"baseline": baseline["fps"], "current": report["fps"],
+                    "change_pct": percent_change(report["fps"], baseline["fps"])},
+            "peak_rss_mb": {"baseline": baseline["peak_rss_mb"], "current": report["peak_rss_mb"],
+                            "change_pct": percent_change(report["peak_rss_mb"], baseline["peak_rss_mb"])},
+            "stages": {}}
+    regressions = []
+
+    # Lower FPS is a regression
+    if diff["fps"]["change_pct"] < -tolerance:
+        regressions.append(f"fps {diff['fps']['change_pct']}%")
+
+    for stage, summary in report["stages"].items():
+        old = baseline.get("stages", {}).get(stage)
+        if old is None:
+            continue
+        diff["stages"][stage] = {}
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            change = percent_change(summary[key], old[key])
+            diff["stages"][stage][key] = {"baseline": old[key], "current": summary[key], "change_pct": change}
+            # p99 over a short run is too noisy to gate on
+            if key != "p99_ms" and change > tolerance:
+                regressions.append(f"{stage} {key} +{change}%")
+
+    return diff, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the flood detection pipeline on a video file")
+    parser.add_argument("--video", default="vid.mp4")
+    parser.add_argument("--weights", default="best.pt")
+    parser.add_argument("--backend", choices=BACKENDS, default="ultralytics")
+    parser.add_argument("--frames", type=int, default=300, help="maximum number of frames to process")
+    parser.add_argument("--imgsz", type=int, default=DEFAULT_IMGSZ)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--overlay", choices=["vectorized", "plot"], default="vectorized",
+                        help="in-place overlay renderer or the ultralytics results.plot()")
+    parser.add_argument("--roi", help="ROI polygons as JSON (pixels or frame fractions) or a JSON file")
+    parser.add_argument("--tile-size", type=int, help="split ROIs larger than this into overlapping tiles")
+    parser.add_argument("--tile-overlap", type=float, default=TILE_OVERLAP)
+    parser.add_argument("--output", help="write the report JSON to this file (e.g. to save a baseline)")
+    parser.add_argument("--compare", help="baseline report JSON to diff against")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args()
+    if args.overlay == "plot" and (args.roi or args.tile_size):
+        parser.error("--overlay plot draws the raw results and cannot be combined with --roi/--tile-size")
+
+    report = run_pipeline(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if not args.compare:
+        print(json.dumps(report, indent=2))
+        return
+
+    with open(args.compare) as f:
+        baseline = json.load(f)
+    diff, regressions = compare(report, baseline, args.tolerance)
+    print(json.dumps({"report": report, "diff": diff, "regressions": regressions}, indent=2))
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
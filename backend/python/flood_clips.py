@@ -0,0 +1,194 @@
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+# Default clip settings
+CLIPS_DIR = os.getenv("FLOOD_CLIPS_DIR", "clips")
+CLIP_PRE_SECONDS = float(os.getenv("FLOOD_CLIP_PRE_SECONDS", "5"))
+CLIP_POST_SECONDS = float(os.getenv("FLOOD_CLIP_POST_SECONDS", "10"))
+CLIP_RING_FRAME_HEADROOM = 1.5  # ring bytes per slot, as a multiple of the first frame's size
+CLIP_MIN_FRAME_BYTES = 64 * 1024  # smallest per-slot budget, for tiny first frames
+CLIP_RING_MARGIN_SECONDS = 2.0  # extra history so the writer can lag behind a little
+
+class FrameRing:
+    """Ring of recent JPEG frames stored back to back in one preallocated byte buffer
+
+    Frames are variable-length records, so an HD camera's large JPEGs fit as well as small
+    ones; the buffer is sized on the first frame (slots x 1.5 times its size) and larger
+    frames simply mean less history. The detection loop is the only writer and copies
+    each encoded frame in, so recording allocates nothing per frame. Readers never lock:
+    they copy a record and then check that the writer did not wrap around onto it in the
+    meantime.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.capacity = None
+        self.buffer = None
+        self.starts = np.zeros(slots, dtype=np.int64)  # position of each record in the byte stream
+        self.sizes = np.zeros(slots, dtype=np.int64)
+        self.timestamps = np.zeros(slots, dtype=np.float64)
+        self.written = 0  # sequence number of the next frame to be written
+        self.end = 0  # byte stream position after the last record
+        self.reserved = 0  # byte stream position after the record being written
+        self.oversized = 0
+
+    def push(self, frame_bytes, timestamp):
+        """Copy an encoded frame into the ring (frames over a quarter of the ring are skipped)"""
+        size = len(frame_bytes)
+        if self.buffer is None:
+            self.capacity = self.slots * int(max(size * CLIP_RING_FRAME_HEADROOM, CLIP_MIN_FRAME_BYTES))
+            self.buffer = memoryview(bytearray(self.capacity))
+        if size > self.capacity // 4:
+            self.oversized += 1
+            return
+
+        # Records never wrap: one that does not fit before the end of the buffer starts at 0
+        start = self.end
+        offset = start % self.capacity
+        if offset + size > self.capacity:
+            start += self.capacity - offset
+            offset = 0
+        # Readers treat everything before reserved - capacity as overwritten from here on
+        self.reserved = start + size
+        self.buffer[offset:offset + size] = frame_bytes
+
+        index = self.written % self.slots
+        self.starts[index] = start
+        self.sizes[index] = size
+        self.timestamps[index] = timestamp
+        self.end = start + size
+        self.written += 1
+
+    def intact(self, sequence):
+        """True if a frame's record and bytes have not been overwritten"""
+        # Keep one slot of distance from the writer, which may be filling it right now
+        if sequence < self.written - self.slots + 1 or sequence >= self.written:
+            return False
+        return self.starts[sequence % self.slots] >= self.reserved - self.capacity
+
+    def oldest(self):
+        """Sequence number of the oldest frame still in the ring"""
+        sequence = max(0, self.written - self.slots + 1)
+        while sequence < self.written and not self.intact(sequence):
+            sequence += 1
+        return sequence
+
+    def find(self, since):
+        """Sequence number of the first frame captured at or after the since timestamp"""
+        sequence = self.written
+        while sequence > self.oldest() and self.timestamps[(sequence - 1) % self.slots] >= since:
+            sequence -= 1
+        return sequence
+
+    def read(self, sequence):
+        """(frame bytes, timestamp) of one frame, or None if it was already overwritten"""
+        if not self.intact(sequence):
+            return None
+        index = sequence % self.slots
+        offset = int(self.starts[index]) % self.capacity
+        timestamp = float(self.timestamps[index])
+        frame_bytes = bytes(self.buffer[offset:offset + int(self.sizes[index])])
+        if not self.intact(sequence):
+            return None
+        return frame_bytes, timestamp
+
+class ClipRecorder:
+    """Saves the footage around a flood detection to an MJPEG file from a background thread"""
+
+    def __init__(self, clips_dir=CLIPS_DIR, pre_seconds=CLIP_PRE_SECONDS, post_seconds=CLIP_POST_SECONDS):
+        self.clips_dir = clips_dir
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.jobs = queue.Queue()
+        self.writer_thread = None
+        self.writer_lock = threading.Lock()
+        self.clips_written = 0
+        self.clips_skipped = 0
+        self.rings = []
+
+    def create_ring(self, fps):
+        """Ring sized to hold the pre-roll at the given frame rate"""
+        ring = FrameRing(max(1, int((self.pre_seconds + CLIP_RING_MARGIN_SECONDS) * fps)))
+        self.rings.append(ring)
+        return ring
+
+    def start(self):
+        """Start the clip writer if it is not already running"""
+        with self.writer_lock:
+            if self.writer_thread is None or not self.writer_thread.is_alive():
+                self.writer_thread = threading.Thread(target=self.writer, daemon=True)
+                self.writer_thread.start()
+
+    def trigger(self, ring, clip_name):
+        """Schedule a clip around now and return the path it will be written to
+
+        Returns None (and records nothing) if the ring has no recent frame, so no path is
+        published for a clip that would stay empty.
+        """
+        now = time.time()
+        if ring.oldest() >= ring.written or ring.timestamps[(ring.written - 1) % ring.slots] < now - self.pre_seconds:
+            self.clips_skipped += 1
+            return None
+        path = os.path.join(self.clips_dir, f"{clip_name}.mjpeg")
+        first_sequence = ring.find(now - self.pre_seconds)
+        self.jobs.put({"ring": ring, "path": path, "sequence": first_sequence,
+                       "end_time": now + self.post_seconds, "frames": 0, "file": None})
+        return path
+
+    def stats(self):
+        return {"clips_dir": self.clips_dir, "pre_seconds": self.pre_seconds,
+                "post_seconds": self.post_seconds, "clips_written": self.clips_written,
+                "clips_skipped": self.clips_skipped,
+                "oversized_frames": sum(ring.oversized for ring in self.rings),
+                "ring_bytes": sum(ring.capacity or 0 for ring in self.rings)}
+
+    def write_available(self, job):
+        """Append every frame the ring has for a job; returns True once the clip is complete"""
+        ring = job["ring"]
+        while job["sequence"] < ring.written:
+            # Fell behind the ring: skip to the oldest frame still available
+            job["sequence"] = max(job["sequence"], ring.oldest())
+            frame = ring.read(job["sequence"])
+            job["sequence"] += 1
+            if frame is None:
+                continue
+            frame_bytes, timestamp = frame
+            if timestamp > job["end_time"]:
+                return True
+            job["file"].write(frame_bytes)
+            job["frames"] += 1
+        return time.time() >= job["end_time"]
+
+    def writer(self):
+        """Follow every open clip's ring as new frames arrive, so clips can overlap"""
+        os.makedirs(self.clips_dir, exist_ok=True)
+        active = []
+        while True:
+            # Block only when there is nothing to follow
+            try:
+                while True:
+                    job = self.jobs.get(block=not active)
+                    job["file"] = open(job["path"], "wb")
+                    active.append(job)
+            except queue.Empty:
+                pass
+            except OSError as e:
+                print(f"Error opening flood clip {job['path']}: {e}")
+
+            for job in list(active):
+                try:
+                    done = self.write_available(job)
+                except OSError as e:
+                    print(f"Error writing flood clip {job['path']}: {e}")
+                    done = True
+                if done:
+                    job["file"].close()
+                    active.remove(job)
+                    self.clips_written += 1
+                    print(f"Saved flood clip {job['path']} ({job['frames']} frames)")
+
+            time.sleep(0.05)
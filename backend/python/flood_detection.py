@@ -1,211 +1,1089 @@
-from flask import Flask, Response, render_template_string, jsonify
+from flask import Flask, Response, render_template_string, jsonify, abort, request, send_from_directory
 import cv2
 import time
 import numpy as np
 import os
 import json
+import hashlib
+import logging
 import threading
-import requests  # Add this import for making HTTP requests
+from flood_alerts import AlertDispatcher
+from flood_events import EventBroker
+from flood_history import FloodEventStore, parse_time
+from flood_metrics import MetricsRegistry
+from flood_overlay import RateLimitedLog, draw_detections, extract_detections, flood_class_ids
 
 # Force CPU usage since CUDA libraries are missing
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 
-# Now import YOLO after setting environment variable
-from ultralytics import YOLO
+# Now import the YOLO backends after setting environment variable
+from flood_backends import DEFAULT_IMGSZ, load_backend
+from flood_clips import ClipRecorder
+from flood_pool import InferencePool
+from flood_roi import RegionOfInterest
+from flood_tracking import FloodTracker
 
 app = Flask(__name__)
 
-# Load YOLO model
-model = YOLO("best.pt")  # Replace with your actual model path
+# Load YOLO model through the configured inference backend
+# (ultralytics, onnx, onnx-int8 or openvino; exports are created from the .pt on first use).
+# FLOOD_INFERENCE_WORKERS=N runs the model in N worker processes instead of in this one.
+MODEL_PATH = os.getenv("FLOOD_MODEL", "best.pt")  # Replace with your actual model path
+INFERENCE_BACKEND = os.getenv("FLOOD_BACKEND", "ultralytics")
+INFERENCE_WORKERS = int(os.getenv("FLOOD_INFERENCE_WORKERS", "0"))
+if INFERENCE_WORKERS > 0:
+    model = InferencePool(INFERENCE_BACKEND, MODEL_PATH, INFERENCE_WORKERS)
+else:
+    model = load_backend(INFERENCE_BACKEND, MODEL_PATH)
+flood_classes = flood_class_ids(model.names)
 
-# Video path (or replace with live webcam stream 0)
-video_path = "vid.mp4"  
+# Adaptive input size: with FLOOD_LATENCY_BUDGET_MS set, the model input size moves between
+# FLOOD_IMGSZ_STEPS to keep each batched model call within the budget
+LATENCY_BUDGET = float(os.getenv("FLOOD_LATENCY_BUDGET_MS", "0")) / 1000  # seconds, 0 disables
+IMGSZ_STEPS = sorted(int(size) for size in os.getenv("FLOOD_IMGSZ_STEPS", "320,480,640").split(","))
+IMGSZ_SMOOTHING = 0.2  # weight of the newest latency sample in the moving average
+IMGSZ_DOWN_SAMPLES = 5  # calls measured at a size before it may be stepped down
+IMGSZ_UP_SAMPLES = 30  # calls measured at a size before it may be stepped up
+IMGSZ_UP_HEADROOM = 0.8  # step up only if the projected latency stays under this share of the budget
 
-# Global variables for flood detection status
-flood_detected = False
-flood_detection_time = None
-flood_detection_details = {}
-notification_sent = False  # Track if notification has been sent in this cycle
+# Detection logs are rate limited per source instead of printing every box of every frame
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("flood_detection")
+DETECTION_LOG_INTERVAL = float(os.getenv("FLOOD_DETECTION_LOG_INTERVAL", "5.0"))  # seconds per source
+detection_log = RateLimitedLog(logger, DETECTION_LOG_INTERVAL)
+
+# Video sources to monitor. Override with a JSON list in FLOOD_SOURCES_FILE, e.g.
+# [{"name": "vasai", "path": "vid.mp4", "location": "vasai"},
+#  {"name": "river-cam", "path": 0, "location": "virar",
+#   "roi": [[[0, 0.4], [1, 0.4], [1, 1], [0, 1]]], "tile_size": 640}]
+# "path" can be a video file, a stream URL or a webcam index. Optional "roi" polygons
+# (pixels or fractions of the frame) limit what the model sees, and "tile_size" splits
+# large ROIs into overlapping tiles ("tile_overlap", default 0.2).
+FLOOD_SOURCES_FILE = os.getenv("FLOOD_SOURCES_FILE", "flood_sources.json")
+DEFAULT_SOURCES = [
+    {"name": "vasai", "path": "vid.mp4", "location": "vasai"}
+]
+
+# Reconnect backoff for sources that fail to open or drop out (doubles up to the max)
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+
+# Motion gating: only run the model when the scene changed or the last inference is too old
+MOTION_GATE_ENABLED = os.getenv("FLOOD_MOTION_GATE", "0") == "1"
+MOTION_GATE_THRESHOLD = float(os.getenv("FLOOD_MOTION_THRESHOLD", "4.0"))  # mean abs grey-level difference
+MOTION_GATE_MAX_INTERVAL = float(os.getenv("FLOOD_MOTION_MAX_INTERVAL", "2.0"))  # seconds
+MOTION_GATE_WIDTH = 160  # width of the downscaled frame used for the difference
+
+# Track-between-detections: with FLOOD_TRACK_INTERVAL=K the model runs on every Kth frame
+# and optical flow moves the boxes (keeping their track IDs) on the frames in between
+TRACK_KEYFRAME_INTERVAL = int(os.getenv("FLOOD_TRACK_INTERVAL", "1"))
+
+# Output frame rate of the detection loop. When the loop falls behind, source frames are
+# dropped instead of sleeping. FLOOD_NATIVE_FPS=1 plays video files at their own CAP_PROP_FPS.
+TARGET_FPS = float(os.getenv("FLOOD_TARGET_FPS", "30"))
+PLAY_AT_NATIVE_FPS = os.getenv("FLOOD_NATIVE_FPS", "0") == "1"
+
+# Limits for the per-viewer /video_feed tiers (?w=&q=&fps=)
+STREAM_MIN_WIDTH = 64
+STREAM_MIN_QUALITY = 10
+STREAM_MAX_QUALITY = 95
+
+# Lock protecting the flood detection status of every source
 flood_detection_lock = threading.Lock()
 
 # WhatsApp notification endpoint
 NOTIFICATION_ENDPOINT = "https://35ff-136-232-248-186.ngrok-free.app/flood-alert"  # Replace with actual endpoint
 
-def send_notification(location="vasai"):
-    """Send a notification to the WhatsApp bot via API call"""
-    try:
-        # Make a GET request to the notification endpoint
-        response = requests.get(f"{NOTIFICATION_ENDPOINT}?location={location}")
-        
-        if response.status_code == 200:
-            print(f"Notification successfully sent for location: {location}")
-            return True
+# Alerts are delivered in the background; the frame loop only enqueues them
+alert_dispatcher = AlertDispatcher(NOTIFICATION_ENDPOINT)
+
+# Frame overlay text for each notification status (no status yet reads as pending)
+NOTIFICATION_LABELS = {
+    "sent": "Alert sent to WhatsApp",
+    "failed": "Alert failed",
+    "deduplicated": "Recent alert covers this location"
+}
+
+# Flood state changes are pushed to /flood_events subscribers through the broker
+event_broker = EventBroker()
+EVENT_HEARTBEAT_INTERVAL = 15.0  # seconds between keep-alive comments on idle streams
+
+# Detection episodes are logged to the history store; an episode ends after this many
+# seconds without a flood detection (or when the video loops)
+event_store = FloodEventStore()
+EPISODE_END_GAP = float(os.getenv("FLOOD_EPISODE_END_GAP", "5.0"))
+
+# Footage around each new episode is saved to disk from a ring buffer of encoded frames
+# (pre/post-roll and directory are set with FLOOD_CLIP_* variables, FLOOD_CLIPS=0 disables)
+CLIPS_ENABLED = os.getenv("FLOOD_CLIPS", "1") == "1"
+clip_recorder = ClipRecorder() if CLIPS_ENABLED else None
+
+# Metrics served at /metrics. Recording is lock-free; formatting only happens at scrape time.
+metrics = MetricsRegistry()
+frames_decoded_total = metrics.counter("flood_frames_decoded_total", "Frames read from a source", ("source",))
+frames_inferred_total = metrics.counter("flood_frames_inferred_total", "Frames run through the model", ("source",))
+frames_skipped_total = metrics.counter("flood_frames_skipped_total",
+                                       "Frames that reused earlier detections (motion gate)", ("source",))
+frames_dropped_total = metrics.counter("flood_frames_dropped_total",
+                                       "Source frames dropped to stay real-time", ("source",))
+frames_tracked_total = metrics.counter("flood_frames_tracked_total",
+                                       "Frames whose boxes were moved by the tracker instead of inferred",
+                                       ("source",))
+inference_seconds = metrics.histogram("flood_inference_seconds", "Latency of one batched model call")
+encode_seconds = metrics.histogram("flood_jpeg_encode_seconds", "Latency of encoding one frame to JPEG")
+detections_total = metrics.counter("flood_detections_total", "Detections on inferred frames by class", ("class",))
+# Request threads are short-lived, so connection counts are plain attributes read at scrape time
+metrics.function("flood_video_feed_subscribers", "Open /video_feed streams", "gauge",
+                 lambda: sum(source.broadcaster.viewers for source in sources.values()))
+metrics.function("flood_events_subscribers", "Open /flood_events streams", "gauge",
+                 lambda: event_broker.subscribers)
+metrics.function("flood_stream_tier_encodes_total", "Frames re-encoded for reduced /video_feed tiers", "counter",
+                 lambda: sum(source.broadcaster.tier_encodes for source in sources.values()))
+metrics.function("flood_notification_attempts_total", "Alert delivery attempts", "counter",
+                 lambda: alert_dispatcher.attempts)
+metrics.function("flood_notification_failures_total", "Failed alert delivery attempts", "counter",
+                 lambda: alert_dispatcher.failures)
+
+class FrameBroadcaster:
+    """Shared slot holding the latest annotated JPEG for every /video_feed viewer
+
+    Viewers that ask for a smaller or lower-quality stream get the latest frame re-encoded
+    for their (width, quality) tier. Each tier is encoded at most once per frame, by the
+    first viewer that needs it, and the bytes are shared by everyone else on that tier.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.frame_bytes = None
+        self.frame = None
+        self.sequence = 0
+        self.published_at = None
+        self.tiers = {}
+        self.tier_lock = threading.Lock()
+        self.tier_encodes = 0
+        self.viewers = 0  # open /video_feed streams, updated under the condition lock
+
+    def publish(self, frame_bytes, frame=None):
+        """Replace the latest frame (and the raw image tiers are encoded from) and wake up all viewers"""
+        with self.condition:
+            self.frame_bytes = frame_bytes
+            self.frame = frame
+            self.sequence += 1
+            self.published_at = time.time()
+            self.tiers = {}
+            self.condition.notify_all()
+
+    def wait_for_frame(self, last_sequence, tier=(None, None), timeout=1.0):
+        """Block until a frame newer than last_sequence is available
+
+        Returns (sequence, JPEG bytes, content hash) for a (width, quality) tier; (None, None)
+        is the full-size frame published by the detection loop.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence != last_sequence, timeout=timeout)
+        return self.latest(tier)[:3]
+
+    def latest(self, tier=(None, None)):
+        """(sequence, JPEG bytes, content hash, publish time) of the newest frame, without waiting"""
+        with self.condition:
+            sequence, frame_bytes, frame, tiers = self.sequence, self.frame_bytes, self.frame, self.tiers
+            published_at = self.published_at
+        if frame_bytes is None:
+            return sequence, None, None, None
+
+        # The tiers dict belongs to this frame, so a newer frame never mixes with old encodings
+        with self.tier_lock:
+            cached = tiers.get(tier)
+            if cached is None:
+                width, quality = tier
+                if (width is None and quality is None) or frame is None:
+                    data = frame_bytes
+                else:
+                    data = encode_tier(frame, width, quality)
+                    self.tier_encodes += 1
+                cached = tiers[tier] = (data, hashlib.blake2b(data, digest_size=16).digest())
+        return sequence, cached[0], cached[1], published_at
+
+def encode_tier(frame, width, quality):
+    """JPEG of a frame downscaled to width (never upscaled) at the given quality"""
+    height, frame_width = frame.shape[:2]
+    if width is not None and width < frame_width:
+        frame = cv2.resize(frame, (width, max(1, height * width // frame_width)), interpolation=cv2.INTER_AREA)
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if quality is not None else []
+    _, buffer = cv2.imencode('.jpg', frame, params)
+    return buffer.tobytes()
+
+class RateMeter:
+    """Smoothed events-per-second measurement"""
+
+    def __init__(self, smoothing=0.1):
+        self.smoothing = smoothing
+        self.last_time = None
+        self.rate = 0.0
+
+    def tick(self):
+        now = time.perf_counter()
+        if self.last_time is not None and now > self.last_time:
+            instant_rate = 1.0 / (now - self.last_time)
+            self.rate = instant_rate if self.rate == 0.0 else \
+                self.rate + self.smoothing * (instant_rate - self.rate)
+        self.last_time = now
+
+class ImgszController:
+    """Picks the model input size that keeps inference latency within a budget
+
+    Latency is tracked as a moving average per size. Over budget, the size steps down
+    after a few calls; it steps back up only when the latency projected for the next size
+    (scaled by the pixel count) stays well under the budget, and only after many calls at
+    the current size. The gap between the two conditions keeps it from oscillating.
+    """
+
+    def __init__(self, budget, steps, start_size=DEFAULT_IMGSZ):
+        self.budget = budget
+        self.steps = steps
+        fitting = [index for index, size in enumerate(steps) if size <= start_size]
+        self.index = fitting[-1] if fitting else 0
+        self.average = None
+        self.samples = 0
+        self.changes = 0
+
+    @property
+    def imgsz(self):
+        return self.steps[self.index]
+
+    def observe(self, seconds):
+        """Record the latency of one model call at the current size"""
+        self.average = seconds if self.average is None else \
+            self.average + IMGSZ_SMOOTHING * (seconds - self.average)
+        self.samples += 1
+
+        if self.average > self.budget and self.index > 0 and self.samples >= IMGSZ_DOWN_SAMPLES:
+            self.switch(self.index - 1)
+        elif self.index < len(self.steps) - 1 and self.samples >= IMGSZ_UP_SAMPLES:
+            projected = self.average * (self.steps[self.index + 1] / self.imgsz) ** 2
+            if projected < self.budget * IMGSZ_UP_HEADROOM:
+                self.switch(self.index + 1)
+
+    def switch(self, index):
+        print(f"Inference latency {self.average * 1000:.0f} ms against a {self.budget * 1000:.0f} ms budget: "
+              f"imgsz {self.imgsz} -> {self.steps[index]}")
+        self.index = index
+        self.average = None
+        self.samples = 0
+        self.changes += 1
+
+    def stats(self):
+        """Controller state for /flood_status"""
+        return {
+            "enabled": True,
+            "imgsz": self.imgsz,
+            "steps": self.steps,
+            "budget_ms": round(self.budget * 1000, 1),
+            "latency_ms": round(self.average * 1000, 1) if self.average is not None else None,
+            "changes": self.changes
+        }
+
+class FramePacer:
+    """Deadline scheduler that keeps the detection loop at a target output FPS"""
+
+    def __init__(self, fps):
+        self.fps = fps
+        self.period = 1.0 / fps
+        self.next_deadline = None
+        self.missed_deadlines = 0
+        self.meter = RateMeter()
+
+    def wait(self):
+        """Sleep until the next deadline and return how many deadlines were missed
+
+        The time already spent on inference and encoding is subtracted from the sleep.
+        When the work overran, the deadlines that have fully passed are skipped instead of
+        bursting to catch up, and the caller drops that many source frames to stay
+        real-time. The part of a period left over stays in the schedule, so overruns of
+        less than a period still add up to dropped frames.
+        """
+        now = time.perf_counter()
+        if self.next_deadline is None:
+            self.next_deadline = now
+        self.next_deadline += self.period
+
+        behind = 0
+        if now < self.next_deadline:
+            time.sleep(self.next_deadline - now)
         else:
-            print(f"Failed to send notification. Status code: {response.status_code}")
+            behind = int((now - self.next_deadline) / self.period)
+            self.missed_deadlines += behind
+            self.next_deadline += behind * self.period
+
+        self.meter.tick()
+        return behind
+
+    def stats(self):
+        """Pacing counters for /flood_status"""
+        return {
+            "target_fps": self.fps,
+            "achieved_fps": round(self.meter.rate, 2),
+            "missed_deadlines": self.missed_deadlines
+        }
+
+class MotionGate:
+    """Cheap downscaled frame difference that decides whether a frame needs inference"""
+
+    def __init__(self, threshold, max_interval):
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.reset()
+        self.frames_seen = 0
+        self.frames_skipped = 0
+
+    def reset(self):
+        """Forget the reference frame so the next frame is always inferred"""
+        self.reference = None
+        self.last_inference_time = 0.0
+        self.last_score = None
+
+    def should_infer(self, frame):
+        """Return True if the frame differs enough from the last inferred one"""
+        height, width = frame.shape[:2]
+        small = cv2.resize(frame, (MOTION_GATE_WIDTH, max(1, height * MOTION_GATE_WIDTH // width)),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        now = time.time()
+        self.frames_seen += 1
+
+        # Compare against the last inferred frame so slow drifts still add up
+        if self.reference is not None:
+            self.last_score = float(cv2.absdiff(gray, self.reference).mean())
+            if self.last_score < self.threshold and now - self.last_inference_time < self.max_interval:
+                self.frames_skipped += 1
+                return False
+
+        self.reference = gray
+        self.last_inference_time = now
+        return True
+
+    def stats(self):
+        """Skip counters for /flood_status"""
+        return {
+            "enabled": True,
+            "frames": self.frames_seen,
+            "skipped": self.frames_skipped,
+            "skip_ratio": self.frames_skipped / self.frames_seen if self.frames_seen else 0.0,
+            "last_score": self.last_score
+        }
+
+class VideoSource:
+    """A monitored camera or video file together with its flood detection status
+
+    Video files are read on demand by the detection loop and loop back to frame 0 at the
+    end. Live cameras and streams get their own capture thread that keeps only the newest
+    frame, so a slow model never lets the driver queue up stale frames.
+    """
+
+    def __init__(self, name, path, location, roi=None):
+        self.name = name
+        self.path = path
+        self.location = location
+        self.metric_labels = (name,)
+        self.cap = None
+        self.next_open_time = 0.0
+        self.retry_delay = RECONNECT_MIN_DELAY
+        self.reconnects = 0
+        self.frame_count = 0
+        self.is_file = isinstance(path, str) and os.path.isfile(path)
+
+        # Latest-frame slot filled by the capture thread of live sources
+        self.capture_thread = None
+        self.capture_lock = threading.Lock()
+        self.latest_frame = None
+        self.latest_frame_time = None
+        self.latest_sequence = 0
+        self.consumed_sequence = 0
+        self.frame_age = None
+
+        # Pacing: native playback clock for files and dropped/output frame counters
+        self.native_fps = 0.0
+        self.play_start = 0.0
+        self.frames_dropped = 0
+        self.output_meter = RateMeter()
+
+        # Flood detection status, guarded by flood_detection_lock
+        self.flood_detected = False
+        self.flood_detection_time = None
+        self.flood_detection_details = {}
+        self.notification_sent = False  # Track if notification has been sent in this cycle
+        self.notification_queued = False  # Track if an alert was handed to the dispatcher
+        self.notification_status = None  # queued, sent, failed or deduplicated
+        self.episode = None  # Open detection episode, only touched by the detection loop
+
+        # Latest annotated frame shared by all viewers of this source
+        self.broadcaster = FrameBroadcaster()
+
+        # Recent encoded frames kept for the pre-roll of flood clips
+        self.clip_ring = clip_recorder.create_ring(TARGET_FPS) if clip_recorder is not None else None
+
+        # Optional motion gate and the detections reused while it skips inference
+        self.motion_gate = MotionGate(MOTION_GATE_THRESHOLD, MOTION_GATE_MAX_INTERVAL) if MOTION_GATE_ENABLED else None
+        self.last_detections = None
+
+        # Optional region of interest / tiling applied before inference
+        self.roi = roi
+
+        # Optional tracker that carries boxes between model keyframes
+        self.tracker = FloodTracker(TRACK_KEYFRAME_INTERVAL) if TRACK_KEYFRAME_INTERVAL > 1 else None
+
+    def open(self):
+        """Open the capture, backing off exponentially while the source stays unavailable"""
+        now = time.time()
+        if now < self.next_open_time:
             return False
-    except Exception as e:
-        print(f"Error sending notification: {e}")
-        return False
-
-def generate_frames():
-    global flood_detected, flood_detection_time, flood_detection_details, notification_sent
-    
-    cap = cv2.VideoCapture(video_path)
-    
-    if not cap.isOpened():
-        print("Error: Could not open video file.")
-        return
-    
-    # Reset the video if it reaches the end
-    frame_count = 0
-    
-    while True:
-        success, frame = cap.read()
-        
-        # If frame reading was not successful, reset the video
+
+        self.cap = cv2.VideoCapture(self.path)
+        if not self.cap.isOpened():
+            print(f"Error: Could not open video source '{self.name}' ({self.path}). "
+                  f"Retrying in {self.retry_delay:.0f}s.")
+            self.release()
+            self.next_open_time = now + self.retry_delay
+            self.retry_delay = min(self.retry_delay * 2, RECONNECT_MAX_DELAY)
+            return False
+
+        if self.is_file:
+            self.retry_delay = RECONNECT_MIN_DELAY
+        else:
+            # Ask the driver not to buffer frames we will never look at
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        if PLAY_AT_NATIVE_FPS and self.is_file:
+            self.native_fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.play_start = time.perf_counter()
+        return True
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def reset_status(self):
+        """Reset flood detection status and notification flag for a new video cycle"""
+        with flood_detection_lock:
+            was_detected = self.flood_detected
+            self.flood_detected = False
+            self.flood_detection_time = None
+            self.flood_detection_details = {}
+            self.notification_sent = False
+            self.notification_queued = False
+            self.notification_status = None
+
+        if was_detected:
+            event_broker.publish(self.event_payload())
+
+    def event_payload(self):
+        """Flood state sent to /flood_events subscribers"""
+        with flood_detection_lock:
+            return {
+                "source": self.name,
+                "location": self.location,
+                "flood_detected": self.flood_detected,
+                "notification_sent": self.notification_sent,
+                "notification_status": self.notification_status,
+                "details": self.flood_detection_details.copy() if self.flood_detected else {}
+            }
+
+    def on_notification_result(self, location, status):
+        """Called with the alert's outcome: "sent", "failed", or "deduplicated" (a recent alert covers it)"""
+        with flood_detection_lock:
+            self.notification_status = status
+            self.notification_sent = status == "sent"
+        event_broker.publish(self.event_payload())
+
+        if status == "sent":
+            print(f"API CALL MADE: Flood alert sent for {location}")
+        elif status == "failed":
+            print(f"Failed to make API call for notification.")
+        else:
+            print(f"No new flood alert for {location}: a recent alert already covers it")
+
+    def update_episode(self, flood_class, confidence):
+        """Open, extend or close the detection episode after an inferred frame"""
+        now = time.time()
+        if flood_class is not None:
+            if self.episode is None:
+                self.episode = {
+                    "episode_id": f"{self.name}-{int(now * 1000)}",
+                    "source": self.name,
+                    "location": self.location,
+                    "start": now,
+                    "end": now,
+                    "class": flood_class,
+                    "peak_confidence": confidence,
+                    "peak_frame": self.frame_count,
+                    "clip": None
+                }
+                if self.clip_ring is not None:
+                    self.episode["clip"] = clip_recorder.trigger(self.clip_ring, self.episode["episode_id"])
+                event_store.record("start", self.episode)
+            else:
+                self.episode["end"] = now
+                if confidence > self.episode["peak_confidence"]:
+                    self.episode["class"] = flood_class
+                    self.episode["peak_confidence"] = confidence
+                    self.episode["peak_frame"] = self.frame_count
+        elif self.episode is not None and now - self.episode["end"] > EPISODE_END_GAP:
+            self.close_episode()
+
+    def close_episode(self):
+        """Record the end of the open detection episode, if any"""
+        if self.episode is not None:
+            event_store.record("end", self.episode)
+            self.episode = None
+
+    def restart_cycle(self):
+        """Start a new detection cycle after the video looped"""
+        print(f"[{self.name}] End of video. Processed {self.frame_count} frames.")
+        self.close_episode()
+        self.frame_count = 0
+        self.play_start = time.perf_counter()
+        self.reset_status()
+        self.last_detections = None
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        if self.tracker is not None:
+            self.tracker.reset()
+        print(f"[{self.name}] Video restarted.")
+
+    def skip_frames(self, count):
+        """Drop source frames without decoding them"""
+        for _ in range(count):
+            if not self.cap.grab():
+                break
+            self.frame_count += 1
+            self.frames_dropped += 1
+            frames_dropped_total.inc(1, self.metric_labels)
+
+    def read_frame(self, behind=0):
+        """Return the next frame to run detection on, or None if there is none yet
+
+        For files, behind is the number of output deadlines the loop missed; that many
+        source frames are dropped. Files played at their native FPS follow the wall clock
+        instead and return None while the next frame is not yet due.
+        """
+        if not self.is_file:
+            return self.read_latest_frame()
+
+        if self.cap is None and not self.open():
+            return None
+
+        skip = behind
+        if self.native_fps > 0:
+            due = int((time.perf_counter() - self.play_start) * self.native_fps) + 1
+            if due <= self.frame_count:
+                return None
+            skip = due - self.frame_count - 1
+        if skip > 0:
+            self.skip_frames(skip)
+
+        success, frame = self.cap.read()
+
+        # At the end of the file, seek back to the first frame instead of reopening it
         if not success:
-            print(f"End of video or error reading frame. Processed {frame_count} frames.")
-            cap.release()
-            cap = cv2.VideoCapture(video_path)  # Restart the video
-            success, frame = cap.read()
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, frame = self.cap.read()
             if not success:  # If still can't read, there's a problem with the file
-                print("Error restarting video. Exiting.")
-                break
-            frame_count = 0
-            
-            # Reset global flood detection status and notification flag when restarting video
-            with flood_detection_lock:
-                flood_detected = False
-                flood_detection_time = None
-                flood_detection_details = {}
-                notification_sent = False
-            
-            print("Video restarted.")
-        
-        frame_count += 1
-        height, width = frame.shape[:2]
-        
-        # Process frame with model regardless of previous detections
+                print(f"[{self.name}] Error restarting video.")
+                self.release()
+                return None
+            self.restart_cycle()
+
+        self.frame_count += 1
+        frames_decoded_total.inc(1, self.metric_labels)
+        return frame
+
+    def start_capture(self):
+        """Start the capture thread of a live source if it is not already running"""
+        if self.capture_thread is None or not self.capture_thread.is_alive():
+            self.capture_thread = threading.Thread(target=self.capture_worker, daemon=True)
+            self.capture_thread.start()
+
+    def capture_worker(self):
+        """Read a live source as fast as it delivers, keeping only the newest frame"""
+        while True:
+            if self.cap is None:
+                if not self.open():
+                    time.sleep(max(0.0, self.next_open_time - time.time()))
+                    continue
+
+            success, frame = self.cap.read()
+            if not success:
+                # Streams that open but never deliver frames back off as well
+                print(f"[{self.name}] Lost video source, reconnecting in {self.retry_delay:.0f}s.")
+                self.release()
+                self.reconnects += 1
+                self.next_open_time = time.time() + self.retry_delay
+                self.retry_delay = min(self.retry_delay * 2, RECONNECT_MAX_DELAY)
+                continue
+
+            self.retry_delay = RECONNECT_MIN_DELAY
+            with self.capture_lock:
+                self.latest_frame = frame
+                self.latest_frame_time = time.time()
+                self.latest_sequence += 1
+
+    def read_latest_frame(self):
+        """Take the newest captured frame of a live source, or None if nothing new arrived"""
+        self.start_capture()
+
+        with self.capture_lock:
+            if self.latest_sequence == self.consumed_sequence:
+                return None
+            frame = self.latest_frame
+            sequence = self.latest_sequence
+            self.frame_age = time.time() - self.latest_frame_time
+
+        # Frames overwritten before we got to them were dropped to stay real-time
+        if self.consumed_sequence and sequence - self.consumed_sequence > 1:
+            self.frames_dropped += sequence - self.consumed_sequence - 1
+            frames_dropped_total.inc(sequence - self.consumed_sequence - 1, self.metric_labels)
+        self.consumed_sequence = sequence
+        self.frame_count += 1
+        frames_decoded_total.inc(1, self.metric_labels)
+        return frame
+
+    def status(self):
+        """Snapshot of the flood detection status for the JSON endpoints"""
+        with flood_detection_lock:
+            return {
+                "source": self.name,
+                "location": self.location,
+                "flood_detected": self.flood_detected,
+                "detection_time": self.flood_detection_time,
+                "details": self.flood_detection_details,
+                "notification_sent": self.notification_sent,
+                "notification_status": self.notification_status,
+                "motion_gate": self.motion_gate.stats() if self.motion_gate is not None else {"enabled": False},
+                "tracking": self.tracker.stats() if self.tracker is not None else {"enabled": False},
+                "roi": self.roi.stats() if self.roi is not None else {"enabled": False},
+                "pacing": {
+                    "output_fps": round(self.output_meter.rate, 2),
+                    "native_fps": self.native_fps,
+                    "frames_dropped": self.frames_dropped
+                },
+                "capture": {
+                    "live": not self.is_file,
+                    "connected": self.cap is not None,
+                    "reconnects": self.reconnects,
+                    "frame_age_ms": round(self.frame_age * 1000, 1) if self.frame_age is not None else None
+                }
+            }
+
+def load_sources():
+    """Load the configured video sources, falling back to the bundled demo video"""
+    source_configs = DEFAULT_SOURCES
+    if os.path.exists(FLOOD_SOURCES_FILE):
         try:
-            results = model(frame, conf=0.25)
-            annotated_frame = results[0].plot()
-            
-            # Add detection information to the frame
-            detections = len(results[0].boxes)
-            
-            if detections > 0:
-                print(f"Frame {frame_count}: {detections} detections")
-                for i, box in enumerate(results[0].boxes):
-                    class_id = int(box.cls)
-                    class_name = model.names[class_id]
-                    confidence = float(box.conf)
-                    print(f"  Detection {i+1}: {class_name}, Confidence: {confidence:.4f}")
-                    
-                    # Check if this is a flood detection
-                    if "flood" in class_name.lower():
-                        # Update global flood detection status
-                        with flood_detection_lock:
-                            current_flood_detected = flood_detected
-                            current_notification_sent = notification_sent
-                            
-                            flood_detected = True
-                            flood_detection_time = time.strftime("%Y-%m-%d %H:%M:%S")
-                            flood_detection_details = {
-                                "class": class_name,
-                                "confidence": float(confidence),
-                                "frame": frame_count,
-                                "time": flood_detection_time
-                            }
-                        
-                        # Add visual indicator to the frame
-                        cv2.putText(annotated_frame, "FLOOD DETECTED!", (width//2-150, height//2), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 3)
-                        
-                        # Send notification only once per video cycle
-                        if not current_notification_sent:
-                            # Make API call to send WhatsApp notification
-                            notification_success = send_notification(location="vasai")
-                            
-                            with flood_detection_lock:
-                                notification_sent = notification_success
-                            
-                            if notification_success:
-                                print(f"API CALL MADE: Flood alert sent for Vasai at {flood_detection_time}")
-                                print(f"This is the only notification for this video cycle.")
-                            else:
-                                print(f"Failed to make API call for notification.")
-            
-            cv2.putText(annotated_frame, f"Detections: {detections}", (10, 30), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-            
-            # Add notification status to the frame
-            with flood_detection_lock:
-                if flood_detected:
-                    notification_status = "Alert sent to WhatsApp" if notification_sent else "Alert pending"
-                    cv2.putText(annotated_frame, notification_status, (10, height - 20), 
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
+            with open(FLOOD_SOURCES_FILE) as f:
+                source_configs = json.load(f)
         except Exception as e:
-            print(f"Error processing frame {frame_count}: {e}")
-            # Use the original frame if processing fails
-            annotated_frame = frame
-        
-        # Encode frame to JPEG
-        _, buffer = cv2.imencode('.jpg', annotated_frame)
-        frame_bytes = buffer.tobytes()
-
-        # Stream frame over HTTP
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        
-        # Add a small delay to control streaming rate
-        time.sleep(0.03)  # ~30 FPS
-    
-    cap.release()
+            print(f"Error loading {FLOOD_SOURCES_FILE}: {e}. Using default source.")
+
+    loaded = {}
+    for config in source_configs:
+        name = str(config["name"])
+        loaded[name] = VideoSource(name, config["path"], config.get("location", name),
+                                   RegionOfInterest.from_config(config))
+    return loaded
+
+# All monitored sources, keyed by name. The first one is served on the legacy routes.
+sources = load_sources()
+default_source = next(iter(sources.values()))
+
+# Background detection worker (started once, on first request)
+frame_pacer = FramePacer(TARGET_FPS)
+imgsz_controller = None
+if LATENCY_BUDGET > 0:
+    if INFERENCE_BACKEND == "openvino":
+        # The OpenVINO export has a fixed input shape
+        print("Adaptive imgsz is not supported by the openvino backend; using a fixed input size.")
+    else:
+        imgsz_controller = ImgszController(LATENCY_BUDGET, IMGSZ_STEPS)
+metrics.function("flood_inference_imgsz", "Model input size in use", "gauge",
+                 lambda: imgsz_controller.imgsz if imgsz_controller is not None else DEFAULT_IMGSZ)
+detection_thread = None
+detection_thread_lock = threading.Lock()
+
+def process_result(source, frame, result, inferred=True):
+    """Update a source's flood state from its detections and return the annotated frame
+
+    result is a (boxes, confidences, class_ids, track_ids) tuple of arrays. When inferred
+    is False the boxes were not detected on this frame (reused by the motion gate or moved
+    by the tracker) and are only drawn; the flood state is left untouched.
+    """
+    height, width = frame.shape[:2]
+
+    # Flood classes are marked with a vectorized mask
+    boxes, confidences, class_ids, track_ids = result
+    flood_mask = np.isin(class_ids, flood_classes)
+    detections = len(class_ids)
+
+    # Draw straight onto the decoded frame; it isn't used for anything else afterwards
+    annotated_frame = draw_detections(frame, boxes, confidences, class_ids, model.names, flood_mask, track_ids)
+    if source.roi is not None:
+        source.roi.draw(annotated_frame)
+
+    # Pick the most confident flood detection in this frame
+    flood_class = None
+    flood_confidence = 0.0
+    if flood_mask.any():
+        best = int(np.argmax(np.where(flood_mask, confidences, -1.0)))
+        flood_class = model.names[int(class_ids[best])]
+        flood_confidence = float(confidences[best])
+
+    if inferred and detections > 0:
+        detected_ids, counts = np.unique(class_ids, return_counts=True)
+        for class_id, count in zip(detected_ids.tolist(), counts.tolist()):
+            detections_total.inc(count, (model.names[class_id],))
+        detection_log.info(source.name, "detections source=%s frame=%d count=%d flood=%d max_conf=%.3f",
+                           source.name, source.frame_count, detections, int(flood_mask.sum()),
+                           float(confidences.max()))
+
+    if inferred:
+        source.update_episode(flood_class, flood_confidence)
+
+    if flood_class is not None and inferred:
+        # Update the source's flood detection status once per frame
+        with flood_detection_lock:
+            was_detected = source.flood_detected
+            current_notification_queued = source.notification_queued
+            source.notification_queued = True
+            if not current_notification_queued:
+                # Set before the alert reaches the worker, whose callback may finish it at once
+                source.notification_status = "queued"
+
+            source.flood_detected = True
+            source.flood_detection_time = time.strftime("%Y-%m-%d %H:%M:%S")
+            source.flood_detection_details = {
+                "class": flood_class,
+                "confidence": flood_confidence,
+                "frame": source.frame_count,
+                "time": source.flood_detection_time,
+                "location": source.location,
+                "episode_id": source.episode["episode_id"],
+                "clip": source.episode["clip"]
+            }
+            if source.tracker is not None:
+                # Persistent flood regions with how long they lasted and how they grew
+                source.flood_detection_details["tracks"] = source.tracker.summary(flood_classes.tolist(), model.names)
+
+        # Push the transition to live dashboards
+        if not was_detected:
+            event_broker.publish(source.event_payload())
+
+        # Queue a WhatsApp notification only once per video cycle
+        if not current_notification_queued:
+            if alert_dispatcher.enqueue(source.location, callback=source.on_notification_result):
+                print(f"Flood alert queued for {source.location} at {source.flood_detection_time}")
+            else:
+                # A recent alert already covers this location; nothing is sent for this one
+                source.on_notification_result(source.location, "deduplicated")
+
+    if flood_class is not None:
+        # Add visual indicator to the frame
+        cv2.putText(annotated_frame, "FLOOD DETECTED!", (width//2-150, height//2),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 255), 3)
+
+    cv2.putText(annotated_frame, f"Detections: {detections}", (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+    # Add notification status to the frame
+    with flood_detection_lock:
+        if source.flood_detected:
+            notification_status = NOTIFICATION_LABELS.get(source.notification_status, "Alert pending")
+            cv2.putText(annotated_frame, notification_status, (10, height - 20),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+
+    return annotated_frame
+
+def frame_detections(source, frame, result, mode):
+    """Detections to draw on a frame: fresh from the model, reused, or moved by the tracker"""
+    if mode == "tracked":
+        return source.tracker.propagate(frame)
+    if mode == "skipped":
+        return source.last_detections
+    if result is None:
+        return None
+
+    boxes, confidences, class_ids = result
+    if source.tracker is not None:
+        source.last_detections = source.tracker.update(frame, boxes, confidences, class_ids)
+    else:
+        source.last_detections = (boxes, confidences, class_ids, None)
+    return source.last_detections
+
+def infer_sources(batch_sources, batch_frames):
+    """Run the frames of several sources through the model in one batched call
+
+    Sources with an ROI contribute their crop (and tiles) instead of the full frame.
+    Returns (boxes, confidences, class_ids) in frame coordinates for each source.
+    """
+    images = []
+    spans = []
+    for source, frame in zip(batch_sources, batch_frames):
+        pieces = source.roi.prepare(frame) if source.roi is not None else [frame]
+        spans.append((len(images), len(pieces)))
+        images.extend(pieces)
+
+    imgsz = imgsz_controller.imgsz if imgsz_controller is not None else None
+    outputs = model(images, conf=0.25, imgsz=imgsz)
+
+    detections = []
+    for source, (start, count) in zip(batch_sources, spans):
+        pieces = outputs[start:start + count]
+        # Pull every box out as arrays at once
+        detections.append(source.roi.merge(pieces) if source.roi is not None else extract_detections(pieces[0]))
+    return detections
+
+def detection_worker():
+    """Single inference loop: batch the latest frame of every source through the model"""
+    behind = 0
+    while True:
+        # Collect the latest frame from each source
+        batch_sources = []
+        batch_frames = []
+        skipped_sources = []
+        skipped_frames = []
+        tracked_sources = []
+        tracked_frames = []
+        for source in sources.values():
+            frame = source.read_frame(behind)
+            if frame is None:
+                continue
+            # Between keyframes the tracker moves the last boxes instead of running the model
+            if source.tracker is not None and not source.tracker.keyframe_due():
+                tracked_sources.append(source)
+                tracked_frames.append(frame)
+                frames_tracked_total.inc(1, source.metric_labels)
+                continue
+            # Static scenes reuse the previous detections instead of running the model
+            gate = source.motion_gate
+            if gate is not None and not gate.should_infer(frame) and source.last_detections is not None:
+                skipped_sources.append(source)
+                skipped_frames.append(frame)
+                frames_skipped_total.inc(1, source.metric_labels)
+            else:
+                batch_sources.append(source)
+                batch_frames.append(frame)
+                frames_inferred_total.inc(1, source.metric_labels)
+
+        if not batch_frames and not skipped_frames and not tracked_frames:
+            behind = frame_pacer.wait()
+            continue
+
+        # Run every camera that needs inference through the model in one batched call
+        results = []
+        if batch_frames:
+            try:
+                inference_start = time.perf_counter()
+                results = infer_sources(batch_sources, batch_frames)
+                inference_elapsed = time.perf_counter() - inference_start
+                inference_seconds.observe(inference_elapsed)
+                if imgsz_controller is not None:
+                    imgsz_controller.observe(inference_elapsed)
+            except Exception as e:
+                print(f"Error running batched inference on {len(batch_frames)} frames: {e}")
+                results = [None] * len(batch_frames)
+
+        work = [(source, frame, result, "inferred") for source, frame, result in zip(batch_sources, batch_frames, results)]
+        work += [(source, frame, None, "skipped") for source, frame in zip(skipped_sources, skipped_frames)]
+        work += [(source, frame, None, "tracked") for source, frame in zip(tracked_sources, tracked_frames)]
+
+        for source, frame, result, mode in work:
+            try:
+                detections = frame_detections(source, frame, result, mode)
+                annotated_frame = frame if detections is None else process_result(source, frame, detections,
+                                                                                   mode == "inferred")
+            except Exception as e:
+                print(f"[{source.name}] Error processing frame {source.frame_count}: {e}")
+                # Use the original frame if processing fails
+                annotated_frame = frame
+
+            # Encode frame to JPEG once and share it with every viewer of this source
+            encode_start = time.perf_counter()
+            _, buffer = cv2.imencode('.jpg', annotated_frame)
+            encode_seconds.observe(time.perf_counter() - encode_start)
+            frame_bytes = buffer.tobytes()
+            source.broadcaster.publish(frame_bytes, annotated_frame)
+            source.output_meter.tick()
+            if source.clip_ring is not None:
+                source.clip_ring.push(frame_bytes, time.time())
+
+        # Sleep only for what is left of this frame's time slot
+        behind = frame_pacer.wait()
+
+def start_detection_worker():
+    """Start the background detection worker if it is not already running"""
+    global detection_thread
+
+    with detection_thread_lock:
+        alert_dispatcher.start()
+        event_store.start()
+        if clip_recorder is not None:
+            clip_recorder.start()
+        if detection_thread is None or not detection_thread.is_alive():
+            detection_thread = threading.Thread(target=detection_worker, daemon=True)
+            detection_thread.start()
+
+@app.before_request
+def ensure_detection_worker():
+    start_detection_worker()
+
+def get_source(source_name):
+    """Look up a configured source or return 404"""
+    source = sources.get(source_name)
+    if source is None:
+        abort(404, description=f"Unknown source '{source_name}'")
+    return source
+
+def stream_options(args):
+    """Parse the w/q/fps/on_change query parameters of /video_feed; raises ValueError if invalid"""
+    width = int(args["w"]) if args.get("w") else None
+    quality = int(args["q"]) if args.get("q") else None
+    max_fps = float(args["fps"]) if args.get("fps") else None
+    if width is not None and width < STREAM_MIN_WIDTH:
+        raise ValueError(f"w must be at least {STREAM_MIN_WIDTH}")
+    if quality is not None and not STREAM_MIN_QUALITY <= quality <= STREAM_MAX_QUALITY:
+        raise ValueError(f"q must be between {STREAM_MIN_QUALITY} and {STREAM_MAX_QUALITY}")
+    if max_fps is not None and max_fps <= 0:
+        raise ValueError("fps must be positive")
+    on_change = args.get("on_change", "0").lower() in ("1", "true", "yes")
+    return (width, quality), max_fps, on_change
+
+def generate_frames(source, tier=(None, None), max_fps=None, on_change=False):
+    """Stream the shared annotated frames of one source without doing any inference"""
+    last_sequence = 0
+    last_digest = None
+    min_interval = 1.0 / max_fps if max_fps else 0.0
+    next_send_time = 0.0
+
+    with source.broadcaster.condition:
+        source.broadcaster.viewers += 1
+    try:
+        while True:
+            sequence, frame_bytes, digest = source.broadcaster.wait_for_frame(last_sequence, tier)
+            if sequence == last_sequence or frame_bytes is None:
+                continue
+            last_sequence = sequence
+
+            # Frames beyond the viewer's frame rate cap are skipped, not queued
+            now = time.monotonic()
+            if now < next_send_time:
+                continue
+            # Unchanged content is not sent again when the viewer asked for changes only
+            if on_change and digest == last_digest:
+                continue
+            # Keep the cadence while on schedule; after a stall restart it instead of bursting
+            if now - next_send_time < min_interval:
+                next_send_time += min_interval
+            else:
+                next_send_time = now + min_interval
+            last_digest = digest
+
+            # Stream frame over HTTP
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+    finally:
+        with source.broadcaster.condition:
+            source.broadcaster.viewers -= 1
 
 @app.route('/video_feed')
-def video_feed():
-    return Response(generate_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+@app.route('/video_feed/<source_name>')
+def video_feed(source_name=None):
+    """MJPEG stream; ?w=640&q=60&fps=10&on_change=1 selects a lighter tier for slow links"""
+    source = default_source if source_name is None else get_source(source_name)
+    try:
+        tier, max_fps, on_change = stream_options(request.args)
+    except ValueError as e:
+        abort(400, description=f"Invalid stream parameters: {e}")
+    return Response(generate_frames(source, tier, max_fps, on_change),
+                    mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@app.route('/latest_frame.jpg')
+def latest_frame():
+    """Newest annotated frame as a still JPEG, served from memory with ETag/Last-Modified
+
+    ?source= picks the camera and w/q select a smaller tier like /video_feed. Conditional
+    requests are answered with 304; nothing is decoded or inferred for this request.
+    """
+    source = get_source(request.args["source"]) if request.args.get("source") else default_source
+    try:
+        tier, _, _ = stream_options(request.args)
+    except ValueError as e:
+        abort(400, description=f"Invalid snapshot parameters: {e}")
+
+    _, frame_bytes, digest, published_at = source.broadcaster.latest(tier)
+    if frame_bytes is None:
+        response = Response("No frame has been processed yet", status=503, mimetype="text/plain")
+        response.headers["Retry-After"] = "1"
+        return response
+
+    response = Response(frame_bytes, mimetype="image/jpeg")
+    response.set_etag(digest.hex())
+    response.last_modified = published_at
+    # Caches may keep the image but must revalidate, which is cheap thanks to the ETag
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
 
 @app.route('/flood_status')
 def flood_status():
-    global flood_detected, flood_detection_time, flood_detection_details, notification_sent
-    
-    with flood_detection_lock:
-        status = {
-            "flood_detected": flood_detected,
-            "detection_time": flood_detection_time,
-            "details": flood_detection_details,
-            "notification_sent": notification_sent
-        }
-    
+    status = default_source.status()
+    status["sources"] = list(sources.keys())
+    status["loop"] = frame_pacer.stats()
+    status["backend"] = INFERENCE_BACKEND
+    status["inference_pool"] = model.stats() if INFERENCE_WORKERS > 0 else None
+    status["imgsz"] = imgsz_controller.imgsz if imgsz_controller is not None else DEFAULT_IMGSZ
+    status["imgsz_controller"] = imgsz_controller.stats() if imgsz_controller is not None else {"enabled": False}
+    status["alerts"] = alert_dispatcher.stats()
+    status["clips"] = clip_recorder.stats() if clip_recorder is not None else None
+    status["events"] = event_broker.stats()
     return jsonify(status)
 
+@app.route('/flood_status/<source_name>')
+def source_flood_status(source_name):
+    return jsonify(get_source(source_name).status())
+
+@app.route('/clips/<path:filename>')
+def flood_clip(filename):
+    """Download a saved flood clip (MJPEG)"""
+    if clip_recorder is None:
+        abort(404)
+    return send_from_directory(os.path.abspath(clip_recorder.clips_dir), filename, mimetype="video/x-motion-jpeg")
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/flood_history')
+def flood_history():
+    """Detection episode history, newest first: ?source=&from=&to=&limit=&cursor="""
+    try:
+        start = parse_time(request.args.get("from"))
+        end = parse_time(request.args.get("to"))
+        limit = int(request.args.get("limit", 100))
+        events, next_cursor = event_store.query(request.args.get("source"), start, end,
+                                                limit, request.args.get("cursor"))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query parameter: {e}"}), 400
+
+    return jsonify({"events": events, "next_cursor": next_cursor})
+
 @app.route('/flood_events')
 def flood_events():
-    def event_stream():
-        global flood_detected, flood_detection_details, notification_sent
-        last_status = False
-        
-        while True:
-            with flood_detection_lock:
-                current_status = flood_detected
-                current_notification = notification_sent
-                details = flood_detection_details.copy() if flood_detected else {}
-            
-            # Only send an event when the status changes to detected
-            if current_status and not last_status:
-                data = {
-                    "flood_detected": True,
-                    "notification_sent": current_notification,
-                    "details": details
-                }
-                yield f"data: {json.dumps(data)}\n\n"
-            
-            last_status = current_status
-            time.sleep(0.5)  # Check every half second
-    
-    return Response(event_stream(), mimetype="text/event-stream")
+    # Browsers send Last-Event-ID when reconnecting; the query parameter helps other clients
+    last_event_id = request.headers.get("Last-Event-ID", request.args.get("last_event_id"))
+    last_id = event_broker.resume_id(last_event_id)
+
+    response = Response(event_broker.subscribe(last_id, EVENT_HEARTBEAT_INTERVAL), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 @app.route('/')
 def index():
@@ -240,7 +1118,7 @@ def index():
                     .then(response => response.json())
                     .then(data => {
                         if (data.flood_detected) {
-                            showFloodAlert(data.details, data.notification_sent);
+                            showFloodAlert(data.details, data.notification_status);
                         }
                     });
                 
@@ -250,20 +1128,17 @@ def index():
                 eventSource.onmessage = function(event) {
                     const data = JSON.parse(event.data);
                     if (data.flood_detected) {
-                        showFloodAlert(data.details, data.notification_sent);
+                        showFloodAlert(data.details, data.notification_status);
                     }
                 };
                 
                 eventSource.onerror = function() {
+                    // The browser reconnects on its own and resumes with Last-Event-ID
                     console.error('EventSource failed. Reconnecting...');
-                    eventSource.close();
-                    setTimeout(() => {
-                        location.reload();
-                    }, 5000);
                 };
             });
             
-            function showFloodAlert(details, notificationSent) {
+            function showFloodAlert(details, notificationStatus) {
                 const alertDiv = document.getElementById('floodAlert');
                 alertDiv.style.display = 'block';
                 
@@ -272,12 +1147,17 @@ def index():
                     detailsText = `<br>Class: ${details.class || 'Unknown'}<br>
                                   Confidence: ${(details.confidence * 100).toFixed(2)}%<br>
                                   Time: ${details.time || 'Unknown'}<br>
-                                  Location: Vasai`;
+                                  Location: ${details.location || 'Unknown'}`;
                 }
                 
-                const notificationText = notificationSent ? 
-                    '<br><span style="color: #8eff8e;">WhatsApp alert has been sent!</span>' : 
-                    '<br><span style="color: #ffff8e;">WhatsApp alert pending...</span>';
+                let notificationText = '<br><span style="color: #ffff8e;">WhatsApp alert pending...</span>';
+                if (notificationStatus === 'sent') {
+                    notificationText = '<br><span style="color: #8eff8e;">WhatsApp alert has been sent!</span>';
+                } else if (notificationStatus === 'deduplicated') {
+                    notificationText = '<br><span style="color: #ffff8e;">A recent WhatsApp alert already covers this location.</span>';
+                } else if (notificationStatus === 'failed') {
+                    notificationText = '<br><span style="color: #ff8e8e;">WhatsApp alert could not be sent.</span>';
+                }
                 
                 alertDiv.innerHTML = `<strong>ALERT!</strong> Flood detected!${detailsText}${notificationText}`;
             }
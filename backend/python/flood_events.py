@@ -0,0 +1,75 @@
+import json
+import threading
+from collections import deque
+
+# Number of recent events kept so reconnecting clients can catch up
+EVENT_HISTORY_SIZE = 256
+
+class EventBroker:
+    """In-process pub/sub for flood state changes
+
+    Publishers append numbered events; subscribers block on a condition variable until
+    an event newer than the last one they saw is available, so idle connections cost no
+    CPU. Recent events are kept so a client reconnecting with Last-Event-ID can resume.
+    """
+
+    def __init__(self, history_size=EVENT_HISTORY_SIZE):
+        self.condition = threading.Condition()
+        self.events = deque(maxlen=history_size)
+        self.last_id = 0
+        self.subscribers = 0
+
+    def publish(self, data):
+        """Publish an event to every subscriber and return its ID"""
+        payload = json.dumps(data)
+        with self.condition:
+            self.last_id += 1
+            self.events.append((self.last_id, payload))
+            self.condition.notify_all()
+            return self.last_id
+
+    def resume_id(self, last_event_id):
+        """Event ID to resume after for a client's Last-Event-ID header; new clients start at the latest"""
+        with self.condition:
+            try:
+                last_event_id = int(last_event_id)
+            except (TypeError, ValueError):
+                return self.last_id
+            # IDs from before a server restart can't be resumed
+            if last_event_id < 0 or last_event_id > self.last_id:
+                return self.last_id
+            return last_event_id
+
+    def wait_for_events(self, last_id, timeout):
+        """Block until events newer than last_id exist, or timeout. Returns them in order."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.last_id > last_id, timeout=timeout)
+            return [event for event in self.events if event[0] > last_id]
+
+    def subscribe(self, last_id, heartbeat_interval):
+        """Generator of Server-Sent Events text, with heartbeat comments while idle"""
+        with self.condition:
+            self.subscribers += 1
+        try:
+            # Tell the browser how long to wait before reconnecting
+            yield "retry: 3000\n\n"
+            while True:
+                events = self.wait_for_events(last_id, heartbeat_interval)
+                if not events:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": heartbeat\n\n"
+                    continue
+                for event_id, payload in events:
+                    yield f"id: {event_id}\ndata: {payload}\n\n"
+                    last_id = event_id
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+
+    def stats(self):
+        """Broker counters for /flood_status"""
+        with self.condition:
+            return {
+                "last_event_id": self.last_id,
+                "subscribers": self.subscribers
+            }
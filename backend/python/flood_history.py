@@ -0,0 +1,179 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+# Default store settings
+HISTORY_DB_PATH = os.getenv("FLOOD_HISTORY_DB", "flood_history.db")
+HISTORY_FLUSH_INTERVAL = 1.0  # seconds between batched writes
+HISTORY_BATCH_SIZE = 200
+HISTORY_MAX_LIMIT = 500
+
+class FloodEventStore:
+    """Append-only SQLite log of flood detection episodes
+
+    Every episode is recorded as a 'start' row when it opens and an 'end' row (with the
+    peak confidence) when it closes. The frame loop only puts rows on a queue; a writer
+    thread inserts them in batches, so disk I/O never adds latency to inference.
+    """
+
+    def __init__(self, db_path=HISTORY_DB_PATH):
+        self.db_path = db_path
+        self.pending = queue.Queue()
+        self.writer_thread = None
+        self.writer_lock = threading.Lock()
+        self.local = threading.local()
+        self.connect().close()
+
+    def connect(self):
+        """Open a connection and make sure the schema exists"""
+        db = sqlite3.connect(self.db_path, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("""
+            CREATE TABLE IF NOT EXISTS flood_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                episode_id TEXT NOT NULL,
+                source TEXT NOT NULL,
+                location TEXT,
+                event TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                class TEXT,
+                confidence REAL,
+                frame INTEGER,
+                started REAL,
+                duration REAL,
+                clip_path TEXT
+            )
+        """)
+        # Databases created before clips were recorded lack the clip_path column
+        columns = [row[1] for row in db.execute("PRAGMA table_info(flood_events)")]
+        if "clip_path" not in columns:
+            db.execute("ALTER TABLE flood_events ADD COLUMN clip_path TEXT")
+        db.execute("CREATE INDEX IF NOT EXISTS flood_events_source_time ON flood_events (source, timestamp)")
+        db.execute("CREATE INDEX IF NOT EXISTS flood_events_time ON flood_events (timestamp)")
+        db.commit()
+        return db
+
+    def reader(self):
+        """Per-thread connection for history queries"""
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = self.local.db = self.connect()
+        return db
+
+    def start(self):
+        """Start the batch writer if it is not already running"""
+        with self.writer_lock:
+            if self.writer_thread is None or not self.writer_thread.is_alive():
+                self.writer_thread = threading.Thread(target=self.writer, daemon=True)
+                self.writer_thread.start()
+
+    def record(self, event, episode):
+        """Queue an episode 'start' or 'end' row; never blocks"""
+        self.pending.put((
+            episode["episode_id"],
+            episode["source"],
+            episode.get("location"),
+            event,
+            episode["end"] if event == "end" else episode["start"],
+            episode.get("class"),
+            episode.get("peak_confidence"),
+            episode.get("peak_frame"),
+            episode["start"],
+            episode["end"] - episode["start"] if event == "end" else None,
+            episode.get("clip")
+        ))
+
+    def writer(self):
+        """Insert queued rows in one transaction per batch"""
+        db = self.connect()
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.time() + HISTORY_FLUSH_INTERVAL
+            while len(batch) < HISTORY_BATCH_SIZE:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            try:
+                with db:
+                    db.executemany(
+                        "INSERT INTO flood_events (episode_id, source, location, event, timestamp, class, "
+                        "confidence, frame, started, duration, clip_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        batch
+                    )
+            except sqlite3.Error as e:
+                print(f"Error writing {len(batch)} flood history rows: {e}")
+
+    def query(self, source=None, start=None, end=None, limit=100, cursor=None):
+        """Newest-first page of events and the cursor for the next page (None when done)"""
+        limit = max(1, min(int(limit), HISTORY_MAX_LIMIT))
+        clauses = []
+        params = []
+        if source:
+            clauses.append("source = ?")
+            params.append(source)
+        if start is not None:
+            clauses.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("timestamp <= ?")
+            params.append(end)
+        if cursor:
+            # Keyset pagination: continue strictly after the last row of the previous page
+            cursor_time, cursor_id = decode_cursor(cursor)
+            clauses.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+            params.extend([cursor_time, cursor_time, cursor_id])
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self.reader().execute(
+            f"SELECT id, episode_id, source, location, event, timestamp, class, confidence, frame, started, duration, "
+            f"clip_path "
+            f"FROM flood_events {where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1][5]!r}:{rows[-1][0]}"
+
+        events = []
+        for row in rows:
+            events.append({
+                "id": row[0],
+                "episode_id": row[1],
+                "source": row[2],
+                "location": row[3],
+                "event": row[4],
+                "timestamp": row[5],
+                "time": datetime.fromtimestamp(row[5]).strftime("%Y-%m-%d %H:%M:%S"),
+                "class": row[6],
+                "confidence": row[7],
+                "frame": row[8],
+                "started": row[9],
+                "duration": row[10],
+                "clip_path": row[11]
+            })
+        return events, next_cursor
+
+def decode_cursor(cursor):
+    """Split a 'timestamp:id' cursor; raises ValueError if it is malformed"""
+    cursor_time, cursor_id = cursor.rsplit(":", 1)
+    return float(cursor_time), int(cursor_id)
+
+def parse_time(value):
+    """Accept epoch seconds or an ISO 8601 date/time; raises ValueError otherwise"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
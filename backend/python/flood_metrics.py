@@ -0,0 +1,158 @@
+import abc
+import bisect
+import threading
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class ShardedMetric(abc.ABC):
+    """Base for metrics whose observations go to a per-thread shard
+
+    Each thread only ever writes its own shard, so recording a value takes no lock and
+    does no formatting. The registry lock is only taken once per thread to register the
+    shard, and at scrape time the shards are merged. Meant for hot-path metrics recorded
+    by long-lived threads (capture and detection loops); the shards of threads that have
+    exited are folded into a base shard at scrape time, so they do not pile up.
+    """
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.local = threading.local()
+        self.base = self.new_shard()  # totals of threads that have exited
+        self.shards = []  # (thread, shard) of live threads
+        self.shards_lock = threading.Lock()
+
+    @abc.abstractmethod
+    def new_shard(self):
+        """Empty shard for a new thread"""
+
+    @abc.abstractmethod
+    def merge(self, total, shard):
+        """Add the values of shard into total"""
+
+    def shard(self):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = self.new_shard()
+            with self.shards_lock:
+                self.shards.append((threading.current_thread(), shard))
+        return shard
+
+    def merged(self):
+        """Sum of every shard, after folding the shards of finished threads into the base"""
+        total = self.new_shard()
+        with self.shards_lock:
+            live = []
+            for thread, shard in self.shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    # The thread is gone, so its shard will not change any more
+                    self.merge(self.base, shard)
+            self.shards = live
+            self.merge(total, self.base)
+        for _, shard in live:
+            self.merge(total, shard)
+        return total
+
+    def format_labels(self, values, extra=""):
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter(ShardedMetric):
+    """Monotonic counter, optionally split by label values"""
+    metric_type = "counter"
+
+    def new_shard(self):
+        return {}
+
+    def merge(self, total, shard):
+        for labels, value in dict(shard).items():
+            total[labels] = total.get(labels, 0) + value
+
+    def inc(self, amount=1, labels=()):
+        shard = self.shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def collect(self):
+        totals = self.merged()
+        return [f"{self.name}{self.format_labels(labels)} {value}" for labels, value in sorted(totals.items())]
+
+class Histogram(ShardedMetric):
+    """Cumulative-bucket histogram of observed values"""
+    metric_type = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)  # set first: the base shard is sized from it
+        super().__init__(name, help_text)
+
+    def new_shard(self):
+        # One slot per bucket plus +Inf, then the running sum
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def merge(self, total, shard):
+        for i, value in enumerate(list(shard)):
+            total[i] += value
+
+    def observe(self, value):
+        shard = self.shard()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def collect(self):
+        totals = self.merged()
+
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, totals):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        cumulative += totals[len(self.buckets)]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{self.name}_sum {totals[-1]}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+class FunctionMetric:
+    """Counter or gauge whose value is read from a function at scrape time"""
+
+    def __init__(self, name, help_text, metric_type, function):
+        self.name = name
+        self.help_text = help_text
+        self.metric_type = metric_type
+        self.function = function
+
+    def collect(self):
+        return [f"{self.name} {self.function()}"]
+
+class MetricsRegistry:
+    """Collection of metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, buckets))
+
+    def function(self, name, help_text, metric_type, function):
+        return self.register(FunctionMetric(name, help_text, metric_type, function))
+
+    def render(self):
+        """Text exposition of every metric; all string formatting happens here"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.metric_type}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,71 @@
+import time
+
+import cv2
+import numpy as np
+
+# Box colours (BGR); flood detections are always drawn in red
+CLASS_COLORS = np.array([
+    (255, 56, 56), (255, 157, 151), (255, 112, 31), (255, 178, 29), (207, 210, 49),
+    (72, 249, 10), (146, 204, 23), (61, 219, 134), (26, 147, 52), (0, 212, 187),
+], dtype=np.int32)
+FLOOD_COLOR = (0, 0, 255)
+BOX_THICKNESS = 2
+LABEL_SCALE = 0.5
+
+def extract_detections(result):
+    """Boxes (N, 4) xyxy, confidences (N,) and class IDs (N,) of a result as NumPy arrays
+
+    Reads the whole boxes tensor in one call instead of touching every box object.
+    """
+    data = result.boxes.data
+    if hasattr(data, "cpu"):
+        data = data.cpu().numpy()
+    data = np.asarray(data, dtype=np.float32)
+    if data.size == 0:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int32)
+    # Tracked results carry an extra ID column before conf/cls, so index from the end
+    return data[:, :4], data[:, -2], data[:, -1].astype(np.int32)
+
+def flood_class_ids(names):
+    """IDs of every class whose name mentions flood"""
+    return np.array([class_id for class_id, name in names.items() if "flood" in name.lower()], dtype=np.int32)
+
+def draw_detections(frame, boxes, confidences, class_ids, names, flood_mask, track_ids=None):
+    """Draw boxes and labels (with track IDs when given) directly onto frame (no copy)"""
+    if len(class_ids) == 0:
+        return frame
+
+    corners = boxes.round().astype(np.int32)
+    colors = CLASS_COLORS[class_ids % len(CLASS_COLORS)]
+    colors[flood_mask] = FLOOD_COLOR
+    tracks = track_ids.tolist() if track_ids is not None else [None] * len(class_ids)
+
+    for (x1, y1, x2, y2), color, class_id, confidence, track_id in zip(corners.tolist(), colors.tolist(),
+                                                                       class_ids.tolist(), confidences.tolist(),
+                                                                       tracks):
+        label = f"{names.get(class_id, class_id)} {confidence:.2f}"
+        if track_id is not None:
+            label = f"{names.get(class_id, class_id)} #{track_id} {confidence:.2f}"
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, BOX_THICKNESS)
+        cv2.putText(frame, label, (x1, max(y1 - 5, 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, LABEL_SCALE, color, 1, cv2.LINE_AA)
+    return frame
+
+class RateLimitedLog:
+    """Emits at most one log record per key per interval, counting what was suppressed"""
+
+    def __init__(self, logger, interval):
+        self.logger = logger
+        self.interval = interval
+        self.last_time = {}
+        self.suppressed = {}
+
+    def info(self, key, message, *args):
+        now = time.monotonic()
+        if now - self.last_time.get(key, 0.0) < self.interval:
+            self.suppressed[key] = self.suppressed.get(key, 0) + 1
+            return
+        self.last_time[key] = now
+        suppressed = self.suppressed.pop(key, 0)
+        # Arguments are only formatted if the record is actually emitted
+        self.logger.info(message + " suppressed=%d", *args, suppressed)
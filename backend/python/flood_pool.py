@@ -0,0 +1,207 @@
+"""Multi-process inference for the flood YOLO model.
+
+InferencePool starts N worker processes that each load the model once, and is called like
+any other backend: pool(frames, conf=0.25) returns one ultralytics Results per frame.
+Frames are copied into slots of a shared-memory ring and only the slot indices and frame
+shapes go through the task queue, so raw pixels are never pickled. Each call is split into
+one chunk per worker, so a batch from many cameras runs on all workers at once, and only
+the boxes come back to the Flask process for annotation and streaming.
+
+Workers are forked, so the pool has to be created before any other threads are started.
+"""
+import atexit
+import math
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from flood_backends import DEFAULT_IMGSZ, load_backend
+from ultralytics.engine.results import Results
+
+# Default pool settings
+POOL_SLOT_BYTES = int(os.getenv("FLOOD_POOL_SLOT_BYTES", str(1920 * 1080 * 3)))  # largest frame a slot holds
+POOL_SLOTS_PER_WORKER = 4
+POOL_RESULT_TIMEOUT = 30.0  # seconds to wait for a worker before giving up on a batch
+POOL_START_TIMEOUT = float(os.getenv("FLOOD_POOL_START_TIMEOUT", "300"))  # seconds for every model to load
+
+def inference_worker(shm, slot_bytes, backend, weights, imgsz, threads, tasks, results):
+    """Worker process: load the model once, then run every task it is handed"""
+    import cv2
+    import torch
+
+    import flood_backends
+
+    # Split the cores between workers instead of every worker spinning up a full pool
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(1)
+    flood_backends.ONNX_INTRA_OP_THREADS = threads
+
+    # The parent waits for this message; a load error is sent instead of the class names
+    try:
+        model = load_backend(backend, weights, imgsz)
+    except BaseException as e:
+        results.put((None, f"{type(e).__name__}: {e}"))
+        return
+    results.put((None, model.names))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, frames_info, conf, task_imgsz = task
+        try:
+            # Views straight into shared memory; nothing is copied on the way in
+            frames = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+                      for slot, shape in frames_info]
+            boxes = []
+            for result in model(frames, conf=conf, imgsz=task_imgsz):
+                data = result.boxes.data
+                if hasattr(data, "cpu"):
+                    data = data.cpu().numpy()
+                boxes.append(np.asarray(data, dtype=np.float32))
+            del frames
+            results.put((task_id, boxes))
+        except Exception as e:
+            results.put((task_id, f"{type(e).__name__}: {e}"))
+
+class InferencePool:
+    """N model processes fed through a shared-memory frame ring"""
+
+    def __init__(self, backend, weights, workers, imgsz=DEFAULT_IMGSZ, slot_bytes=POOL_SLOT_BYTES, slots=None):
+        self.workers = workers
+        self.slot_bytes = slot_bytes
+        self.slots = slots or workers * POOL_SLOTS_PER_WORKER
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slots * slot_bytes)
+        self.free_slots = list(range(self.slots))
+        self.in_flight = {}  # task ID -> slots it occupies
+        self.next_task_id = 0
+        self.tasks_completed = 0
+        self.lock = threading.Lock()
+
+        context = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        self.processes = [
+            context.Process(target=inference_worker, daemon=True,
+                            args=(self.shm, slot_bytes, backend, weights, imgsz, threads, self.tasks, self.results))
+            for _ in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+        atexit.register(self.close)
+
+        try:
+            self.wait_for_workers()
+        except Exception:
+            self.close()
+            raise
+        print(f"Started {workers} {backend} inference workers ({threads} threads each, {self.slots} frame slots)")
+
+    def wait_for_workers(self):
+        """Wait until every worker reports its model loaded; raise if one fails or dies"""
+        deadline = time.monotonic() + POOL_START_TIMEOUT
+        loaded = 0
+        while loaded < self.workers:
+            try:
+                _, names = self.results.get(timeout=1.0)
+            except queue.Empty:
+                # Loaded workers stay in their task loop, so any exited worker died while loading
+                dead = [process for process in self.processes if not process.is_alive()]
+                if dead:
+                    raise RuntimeError(f"Inference worker exited with code {dead[0].exitcode} "
+                                       f"while loading the model")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Inference workers did not load the model within {POOL_START_TIMEOUT}s")
+                continue
+            if isinstance(names, str):
+                raise RuntimeError(f"Inference worker could not load the model: {names}")
+            self.names = names
+            loaded += 1
+
+    def write_slot(self, slot, frame):
+        """Copy a frame into a shared-memory slot"""
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes does not fit a {self.slot_bytes} byte slot "
+                             f"(raise FLOOD_POOL_SLOT_BYTES)")
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+        view[...] = frame
+
+    def collect(self, indices_by_task, boxes_by_frame, errors):
+        """Wait for one finished task and release its slots"""
+        try:
+            task_id, output = self.results.get(timeout=POOL_RESULT_TIMEOUT)
+        except queue.Empty:
+            raise RuntimeError(f"No inference result within {POOL_RESULT_TIMEOUT}s; is a worker stuck?")
+        # Results of tasks abandoned by an earlier timeout only hand their slots back
+        self.free_slots.extend(self.in_flight.pop(task_id, []))
+        indices = indices_by_task.pop(task_id, None)
+        if indices is None:
+            return
+        self.tasks_completed += 1
+        if isinstance(output, str):
+            errors.append(output)
+            return
+        for index, boxes in zip(indices, output):
+            boxes_by_frame[index] = boxes
+
+    def __call__(self, frames, conf=0.25, imgsz=None):
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+
+        with self.lock:
+            # One chunk per worker, never more frames than the ring can hold
+            chunk_size = min(max(1, math.ceil(len(frames) / self.workers)), self.slots)
+            indices_by_task = {}
+            boxes_by_frame = [None] * len(frames)
+            errors = []
+
+            for start in range(0, len(frames), chunk_size):
+                indices = list(range(start, min(start + chunk_size, len(frames))))
+                while len(self.free_slots) < len(indices):
+                    self.collect(indices_by_task, boxes_by_frame, errors)
+                slots = [self.free_slots.pop() for _ in indices]
+                task_id = self.next_task_id
+                self.next_task_id += 1
+                self.in_flight[task_id] = slots
+                try:
+                    for slot, index in zip(slots, indices):
+                        self.write_slot(slot, np.ascontiguousarray(frames[index], dtype=np.uint8))
+                except ValueError:
+                    self.free_slots.extend(self.in_flight.pop(task_id))
+                    raise
+                self.tasks.put((task_id, [(slot, frames[index].shape) for slot, index in zip(slots, indices)],
+                                conf, imgsz))
+                indices_by_task[task_id] = indices
+
+            while indices_by_task:
+                self.collect(indices_by_task, boxes_by_frame, errors)
+
+        if errors:
+            raise RuntimeError(f"Inference worker failed: {errors[0]}")
+        return [Results(orig_img=frame, path="", names=self.names, boxes=boxes)
+                for frame, boxes in zip(frames, boxes_by_frame)]
+
+    def stats(self):
+        return {"workers": self.workers, "alive": sum(process.is_alive() for process in self.processes),
+                "slots": self.slots, "free_slots": len(self.free_slots), "tasks_completed": self.tasks_completed}
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        if self.shm is None:
+            return
+        for process in self.processes:
+            if process.is_alive():
+                self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()  # e.g. still loading its model
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
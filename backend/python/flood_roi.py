@@ -0,0 +1,130 @@
+import cv2
+import numpy as np
+
+from flood_backends import batched_nms
+from flood_overlay import extract_detections
+
+# Default tiling settings
+TILE_OVERLAP = 0.2  # fraction of a tile shared with its neighbour
+TILE_NMS_IOU = 0.5  # overlap above which boxes from different tiles are merged
+MASK_VALUE = 114  # grey used for pixels outside the polygons (the YOLO letterbox colour)
+ROI_COLOR = (255, 255, 0)
+
+class RegionOfInterest:
+    """Per-source polygons that decide which pixels the model sees
+
+    The frame is cropped to the bounding box of the polygons and everything outside them
+    is painted grey, so the model spends its input resolution on the river instead of the
+    sky. With a tile size set, ROIs larger than a tile are also cut into overlapping tiles
+    (plus one pass over the whole ROI for large regions); all pieces of all sources go
+    through the model in one batch and the boxes are merged back with NMS.
+
+    Polygon points are pixels, or fractions of the frame size when every value is <= 1.
+    """
+
+    def __init__(self, polygons=None, tile_size=None, tile_overlap=TILE_OVERLAP):
+        self.polygons = [np.asarray(polygon, dtype=np.float32).reshape(-1, 2) for polygon in polygons or []]
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.frame_shape = None
+
+    @classmethod
+    def from_config(cls, config):
+        """ROI from a source config entry ("roi", "tile_size", "tile_overlap"), or None if unused"""
+        if not config.get("roi") and not config.get("tile_size"):
+            return None
+        return cls(config.get("roi"), config.get("tile_size"), config.get("tile_overlap", TILE_OVERLAP))
+
+    def layout(self, frame_shape):
+        """Work out the pixel polygons, mask, crop and tiles for a frame size (cached)"""
+        if frame_shape == self.frame_shape:
+            return
+        height, width = frame_shape[:2]
+        self.frame_shape = frame_shape
+
+        self.pixel_polygons = []
+        for polygon in self.polygons:
+            if polygon.size and polygon.max() <= 1.0:
+                polygon = polygon * [width, height]
+            self.pixel_polygons.append(np.round(polygon).astype(np.int32))
+
+        if self.pixel_polygons:
+            self.mask = np.zeros((height, width), dtype=np.uint8)
+            cv2.fillPoly(self.mask, self.pixel_polygons, 255)
+            x, y, w, h = cv2.boundingRect(np.concatenate(self.pixel_polygons))
+            x, y = max(0, x), max(0, y)
+            self.crop = (x, y, min(width, x + w), min(height, y + h))
+        else:
+            self.mask = None
+            self.crop = (0, 0, width, height)
+
+        x1, y1, x2, y2 = self.crop
+        self.inverse_mask = None if self.mask is None else self.mask[y1:y2, x1:x2] == 0
+        self.tiles = [(0, 0, x2 - x1, y2 - y1)]
+        if self.tile_size and max(x2 - x1, y2 - y1) > self.tile_size:
+            # Whole ROI first, then the overlapping tiles
+            self.tiles += [(tx, ty, tx + tw, ty + th)
+                           for ty, th in tile_spans(y2 - y1, self.tile_size, self.tile_overlap)
+                           for tx, tw in tile_spans(x2 - x1, self.tile_size, self.tile_overlap)]
+
+    def prepare(self, frame):
+        """Images to run through the model for this frame (views where possible)"""
+        self.layout(frame.shape)
+        x1, y1, x2, y2 = self.crop
+        region = frame[y1:y2, x1:x2]
+        if self.inverse_mask is not None:
+            region = region.copy()
+            region[self.inverse_mask] = MASK_VALUE
+        return [region[ty1:ty2, tx1:tx2] for tx1, ty1, tx2, ty2 in self.tiles]
+
+    def merge(self, results):
+        """Boxes, confidences and class IDs in frame coordinates from the results of prepare()"""
+        x1, y1 = self.crop[:2]
+        all_boxes = []
+        all_confidences = []
+        all_class_ids = []
+        for (tx1, ty1, _, _), result in zip(self.tiles, results):
+            boxes, confidences, class_ids = extract_detections(result)
+            all_boxes.append(boxes + [x1 + tx1, y1 + ty1, x1 + tx1, y1 + ty1])
+            all_confidences.append(confidences)
+            all_class_ids.append(class_ids)
+        boxes = np.concatenate(all_boxes).astype(np.float32)
+        confidences = np.concatenate(all_confidences)
+        class_ids = np.concatenate(all_class_ids)
+
+        # Drop boxes centred outside the polygons (they only saw the grey mask edge)
+        if self.mask is not None and len(boxes):
+            centers = ((boxes[:, :2] + boxes[:, 2:]) / 2).astype(np.int32)
+            centers[:, 0] = centers[:, 0].clip(0, self.mask.shape[1] - 1)
+            centers[:, 1] = centers[:, 1].clip(0, self.mask.shape[0] - 1)
+            inside = self.mask[centers[:, 1], centers[:, 0]] > 0
+            boxes, confidences, class_ids = boxes[inside], confidences[inside], class_ids[inside]
+
+        if len(self.tiles) > 1 and len(boxes) > 1:
+            # Per-class NMS across tiles
+            keep = batched_nms(boxes, confidences, class_ids, 0.0, TILE_NMS_IOU)
+            boxes, confidences, class_ids = boxes[keep], confidences[keep], class_ids[keep]
+        return boxes, confidences, class_ids
+
+    def draw(self, frame):
+        """Outline the polygons on an annotated frame"""
+        if self.frame_shape is not None and self.pixel_polygons:
+            cv2.polylines(frame, self.pixel_polygons, True, ROI_COLOR, 1, cv2.LINE_AA)
+
+    def stats(self):
+        return {
+            "enabled": True,
+            "polygons": len(self.polygons),
+            "crop": list(self.crop) if self.frame_shape is not None else None,
+            "tiles": len(self.tiles) if self.frame_shape is not None else None,
+            "tile_size": self.tile_size
+        }
+
+def tile_spans(length, tile_size, overlap):
+    """(start, size) of tiles covering length, spread evenly with at least the given overlap"""
+    if length <= tile_size:
+        return [(0, length)]
+    step = max(1, int(tile_size * (1 - overlap)))
+    count = -(-(length - tile_size) // step) + 1
+    starts = np.linspace(0, length - tile_size, count).round().astype(int)
+    return [(int(start), tile_size) for start in starts]
@@ -0,0 +1,194 @@
+import time
+
+import cv2
+import numpy as np
+
+from flood_backends import box_iou
+
+# Default tracker settings
+TRACK_IOU_THRESHOLD = 0.3  # minimum overlap to match a keyframe detection to a track
+TRACK_MAX_MISSES = 2  # keyframes a track may go undetected before it is forgotten
+TRACK_FLOW_WIDTH = 320  # width of the grey frame used for optical flow
+TRACK_MAX_CORNERS = 30  # feature points followed per box
+TRACK_MAX_SCALE_STEP = 0.1  # largest box scale change allowed between two frames
+
+class FloodTracker:
+    """Moves the last YOLO boxes along with optical flow between keyframes
+
+    The model runs only on every keyframe_interval-th frame. Keyframe detections are
+    matched to the existing tracks by IoU, so each region keeps its track ID, and replace
+    the tracked boxes. On the frames in between every live box is shifted and scaled by
+    the median Lucas-Kanade motion of the corners inside it.
+    """
+
+    def __init__(self, keyframe_interval):
+        self.keyframe_interval = keyframe_interval
+        self.next_track_id = 1
+        self.keyframes = 0
+        self.tracked_frames = 0
+        self.reset()
+
+    def reset(self):
+        """Forget every track so the next frame is a keyframe"""
+        self.tracks = []
+        self.previous_gray = None
+        self.scale = 1.0
+        self.frames_since_keyframe = 0
+
+    def keyframe_due(self):
+        """True if the next frame has to go through the model"""
+        return self.previous_gray is None or self.frames_since_keyframe + 1 >= self.keyframe_interval
+
+    def prepare(self, frame):
+        """Downscaled grey frame for optical flow; remembers the scale back to the frame"""
+        height, width = frame.shape[:2]
+        self.scale = TRACK_FLOW_WIDTH / width
+        small = cv2.resize(frame, (TRACK_FLOW_WIDTH, max(1, round(height * self.scale))), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def update(self, frame, boxes, confidences, class_ids):
+        """Correct the tracks with keyframe detections; returns them with their track IDs"""
+        now = time.time()
+        self.previous_gray = self.prepare(frame)
+        self.frames_since_keyframe = 0
+        self.keyframes += 1
+
+        matched_tracks = set()
+        track_ids = np.zeros(len(class_ids), dtype=np.int32)
+        if self.tracks and len(class_ids):
+            # Greedy matching on IoU, only between boxes of the same class
+            track_boxes = np.array([track["box"] for track in self.tracks], dtype=np.float32)
+            track_classes = np.array([track["class_id"] for track in self.tracks])
+            overlap = box_iou(boxes, track_boxes)
+            overlap[class_ids[:, None] != track_classes[None, :]] = 0.0
+            while overlap.size and overlap.max() >= TRACK_IOU_THRESHOLD:
+                detection, index = np.unravel_index(int(np.argmax(overlap)), overlap.shape)
+                track = self.tracks[index]
+                track["box"] = boxes[detection].copy()
+                track["confidence"] = float(confidences[detection])
+                track["misses"] = 0
+                track["last_seen"] = now
+                track_ids[detection] = track["track_id"]
+                matched_tracks.add(index)
+                overlap[detection, :] = 0.0
+                overlap[:, index] = 0.0
+
+        # Tracks the model no longer sees stop being drawn and are dropped after a few keyframes
+        for index, track in enumerate(self.tracks):
+            if index not in matched_tracks:
+                track["misses"] += 1
+        self.tracks = [track for track in self.tracks if track["misses"] <= TRACK_MAX_MISSES]
+
+        for detection in np.flatnonzero(track_ids == 0).tolist():
+            box = boxes[detection].copy()
+            self.tracks.append({
+                "track_id": self.next_track_id,
+                "class_id": int(class_ids[detection]),
+                "box": box,
+                "confidence": float(confidences[detection]),
+                "first_seen": now,
+                "last_seen": now,
+                "first_area": box_area(box),
+                "misses": 0
+            })
+            track_ids[detection] = self.next_track_id
+            self.next_track_id += 1
+
+        return boxes, confidences, class_ids, track_ids
+
+    def propagate(self, frame):
+        """Move every live track along with the optical flow since the previous frame"""
+        gray = self.prepare(frame)
+        live = [track for track in self.tracks if track["misses"] == 0]
+        if live and self.previous_gray is not None and self.previous_gray.shape == gray.shape:
+            height, width = gray.shape
+            points = []
+            owners = []
+            for index, track in enumerate(live):
+                x1, y1, x2, y2 = np.clip(np.round(track["box"] * self.scale).astype(np.int32), 0, [width, height] * 2)
+                if x2 - x1 < 2 or y2 - y1 < 2:
+                    continue
+                mask = np.zeros_like(gray)
+                mask[y1:y2, x1:x2] = 255
+                corners = cv2.goodFeaturesToTrack(self.previous_gray, TRACK_MAX_CORNERS, 0.01, 3, mask=mask)
+                if corners is not None:
+                    points.append(corners.reshape(-1, 2))
+                    owners.append(np.full(len(corners), index))
+
+            if points:
+                # One pyramidal Lucas-Kanade call for the corners of every box
+                start = np.concatenate(points).astype(np.float32)
+                owners = np.concatenate(owners)
+                end, found, _ = cv2.calcOpticalFlowPyrLK(self.previous_gray, gray, start.reshape(-1, 1, 2), None)
+                end = end.reshape(-1, 2)
+                found = found.reshape(-1).astype(bool)
+                for index, track in enumerate(live):
+                    selected = found & (owners == index)
+                    if selected.sum() < 3:
+                        continue
+                    move_track(track, start[selected] / self.scale, end[selected] / self.scale)
+
+        self.previous_gray = gray
+        self.frames_since_keyframe += 1
+        self.tracked_frames += 1
+        return self.detections()
+
+    def detections(self):
+        """Boxes, confidences, class IDs and track IDs of the live tracks"""
+        live = [track for track in self.tracks if track["misses"] == 0]
+        if not live:
+            return (np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32),
+                    np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32))
+        return (np.array([track["box"] for track in live], dtype=np.float32),
+                np.array([track["confidence"] for track in live], dtype=np.float32),
+                np.array([track["class_id"] for track in live], dtype=np.int32),
+                np.array([track["track_id"] for track in live], dtype=np.int32))
+
+    def summary(self, class_ids, names):
+        """Duration and area growth of the live tracks of the given classes"""
+        now = time.time()
+        tracks = []
+        for track in self.tracks:
+            if track["misses"] or track["class_id"] not in class_ids:
+                continue
+            duration = now - track["first_seen"]
+            area = box_area(track["box"])
+            tracks.append({
+                "track_id": track["track_id"],
+                "class": names.get(track["class_id"], track["class_id"]),
+                "confidence": track["confidence"],
+                "duration": round(duration, 2),
+                "area": round(area, 1),
+                "area_growth": round(area / track["first_area"], 3) if track["first_area"] else None,
+                "area_change_per_second": round((area - track["first_area"]) / duration, 1) if duration > 0 else 0.0
+            })
+        return tracks
+
+    def stats(self):
+        """Keyframe/tracked counters for /flood_status"""
+        frames = self.keyframes + self.tracked_frames
+        return {
+            "enabled": True,
+            "keyframe_interval": self.keyframe_interval,
+            "keyframes": self.keyframes,
+            "tracked_frames": self.tracked_frames,
+            "inference_ratio": self.keyframes / frames if frames else 0.0,
+            "live_tracks": sum(1 for track in self.tracks if track["misses"] == 0)
+        }
+
+def box_area(box):
+    return float(max(0.0, box[2] - box[0]) * max(0.0, box[3] - box[1]))
+
+def move_track(track, start, end):
+    """Shift a track's box by the median point motion and scale it by the change in spread"""
+    shift = np.median(end - start, axis=0)
+    scale = 1.0
+    start_spread = np.median(np.linalg.norm(start - start.mean(axis=0), axis=1))
+    if start_spread > 1.0:
+        end_spread = np.median(np.linalg.norm(end - end.mean(axis=0), axis=1))
+        scale = float(np.clip(end_spread / start_spread, 1 - TRACK_MAX_SCALE_STEP, 1 + TRACK_MAX_SCALE_STEP))
+
+    x1, y1, x2, y2 = track["box"]
+    center = np.array([(x1 + x2) / 2, (y1 + y2) / 2]) + shift
+    half = np.array([x2 - x1, y2 - y1]) * scale / 2
+    track["box"] = np.concatenate([center - half, center + half]).astype(np.float32)
@@ -0,0 +1,130 @@
+"""Streaming audio features must match the exact read_audio_file features.
+
+voice_and_news.py loads its models and opens an ngrok tunnel when imported, so only the
+feature extraction code (constants, functions and classes at the top level) is loaded
+from it here.
+
+    python -m pytest test_voice_features.py
+"""
+import ast
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+FEATURE_FUNCTIONS = {"decode_audio", "decoded_sample_count", "decode_with_ffmpeg", "run_ffmpeg", "ffmpeg_command",
+                     "feed_stdin", "read_ffmpeg_blocks", "iter_audio_blocks", "StreamingFeatures",
+                     "read_audio_file_streaming", "read_audio_file"}
+SAMPLE_RATE = 16000
+
+def load_feature_code():
+    """Namespace with the audio feature code of voice_and_news.py"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "voice_and_news.py")
+    with open(path) as f:
+        tree = ast.parse(f.read().replace("!pip", "pass  #"))
+    body = [node for node in tree.body
+            if isinstance(node, (ast.FunctionDef, ast.ClassDef)) and node.name in FEATURE_FUNCTIONS
+            or isinstance(node, ast.Assign) and all(isinstance(target, ast.Name) and target.id.isupper()
+                                                    for target in node.targets)]
+    namespace = {"np": np, "sf": sf, "io": io, "os": os, "subprocess": subprocess, "tempfile": tempfile,
+                 "threading": threading}
+    exec(compile(ast.Module(body=body, type_ignores=[]), path, "exec"), namespace)
+    return namespace
+
+voice = load_feature_code()
+
+def speech_like(rng, seconds=12):
+    """Tone plus noise with a slow amplitude envelope"""
+    t = np.arange(seconds * SAMPLE_RATE) / SAMPLE_RATE
+    envelope = 0.5 + 0.4 * np.sin(2 * np.pi * 0.3 * t)
+    return (envelope * (0.4 * np.sin(2 * np.pi * 220 * t) + 0.1 * rng.normal(size=len(t)))).clip(-1, 1)
+
+def mostly_silence(rng, seconds=12):
+    """90% digital silence with short bursts, so most samples sit in a single histogram bin"""
+    signal = np.zeros(seconds * SAMPLE_RATE)
+    burst = SAMPLE_RATE // 10
+    for start in rng.choice(len(signal) - burst, size=seconds, replace=False):
+        signal[start:start + burst] = 0.3 * rng.normal(size=burst)
+    return signal.clip(-1, 1)
+
+def encode(signal, file_format, subtype=None):
+    if file_format == "dat":
+        return (signal * np.iinfo(np.int16).max).astype(np.int16).tobytes()
+    buffer = io.BytesIO()
+    sf.write(buffer, signal, SAMPLE_RATE, format=file_format.upper(), subtype=subtype)
+    return buffer.getvalue()
+
+@pytest.mark.parametrize("make_signal", [speech_like, mostly_silence])
+@pytest.mark.parametrize("file_format, subtype", [("wav", "PCM_16"), ("wav", "FLOAT"), ("flac", "PCM_16"),
+                                                  ("dat", None)])
+def test_streaming_features_match_exact(make_signal, file_format, subtype):
+    file_data = encode(make_signal(np.random.default_rng(0)), file_format, subtype)
+    # Short enough that read_audio_file takes the exact, fully decoded path
+    assert voice["decoded_sample_count"](file_data, file_format) <= voice["STREAMING_MIN_SAMPLES"]
+
+    exact = voice["read_audio_file"](file_data, file_format)
+    streamed = voice["read_audio_file_streaming"](file_data, file_format)
+    (mean, std, maximum, minimum, median, q25, q75, abs_sum, abs_mean, count) = streamed
+
+    assert count == exact[9]
+    assert count > voice["STREAM_BLOCK_SAMPLES"]  # several blocks were merged
+    assert maximum == exact[2]
+    assert minimum == exact[3]
+    assert mean == pytest.approx(exact[0], abs=1e-6)
+    assert std == pytest.approx(exact[1], rel=1e-5)
+    assert abs_sum == pytest.approx(exact[7], rel=1e-5)
+    assert abs_mean == pytest.approx(exact[8], rel=1e-5)
+
+    tolerance = 2 / voice["QUANTILE_SKETCH_BINS"]
+    assert abs(median - exact[4]) <= tolerance
+    assert abs(q25 - exact[5]) <= tolerance
+    assert abs(q75 - exact[6]) <= tolerance
+
+def test_stereo_is_mixed_down_like_exact_path():
+    rng = np.random.default_rng(1)
+    signal = np.column_stack([speech_like(rng, 6), mostly_silence(rng, 6)])
+    file_data = encode(signal, "wav", "FLOAT")
+
+    exact = voice["read_audio_file"](file_data, "wav")
+    streamed = voice["read_audio_file_streaming"](file_data, "wav")
+    assert streamed[9] == exact[9]
+    assert streamed[0] == pytest.approx(exact[0], abs=1e-6)
+    assert abs(streamed[4] - exact[4]) <= 2 / voice["QUANTILE_SKETCH_BINS"]
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_ffmpeg_downmix_is_channel_mean():
+    rng = np.random.default_rng(2)
+    signal = np.column_stack([speech_like(rng, 3), 0.5 * mostly_silence(rng, 3)])
+    file_data = encode(signal, "wav", "FLOAT")
+    expected = signal.mean(axis=1)
+
+    # Both ffmpeg paths: one decode through the pipe, and the streaming reader
+    decoded = voice["decode_with_ffmpeg"](file_data, "wav")
+    streamed = np.concatenate(list(voice["read_ffmpeg_blocks"]("pipe:0", file_data, voice["STREAM_BLOCK_SAMPLES"])))
+    np.testing.assert_allclose(decoded, expected, atol=1e-6)
+    np.testing.assert_allclose(streamed, expected, atol=1e-6)
+
+def test_long_compressed_recordings_are_streamed():
+    rng = np.random.default_rng(3)
+    signal = 0.01 * rng.normal(size=voice["STREAMING_MIN_SAMPLES"] // 2 + 1)
+    # Stereo: the decoded size counts every channel
+    file_data = encode(np.column_stack([signal, signal]), "flac", "PCM_16")
+    assert len(file_data) < voice["STREAMING_MIN_SAMPLES"] * 4  # far smaller than its float32 samples
+    assert voice["decoded_sample_count"](file_data, "flac") > voice["STREAMING_MIN_SAMPLES"]
+    assert voice["decoded_sample_count"](b"", "m4a") is None  # ffmpeg-only formats always stream
+
+    calls = []
+    streaming = voice["read_audio_file_streaming"]
+    voice["read_audio_file_streaming"] = lambda *args: calls.append(args) or streaming(*args)
+    try:
+        features = voice["read_audio_file"](file_data, "flac")
+    finally:
+        voice["read_audio_file_streaming"] = streaming
+    assert calls
+    assert features[9] == len(signal)
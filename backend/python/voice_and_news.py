@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 import numpy as np
 import joblib
 import os
@@ -11,8 +11,14 @@ import threading
 from pyngrok import ngrok
 import tempfile
 import soundfile as sf
-from pydub import AudioSegment
 import io
+import json
+import math
+import subprocess
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 # Add these imports at the top of your file
 import feedparser
 import requests
@@ -60,6 +66,7 @@ except Exception as e:
     label_encoder = None
 
 # Configure 4-bit quantization for Med42 model
+MED42_MODEL_NAME = "m42-health/Llama3-Med42-8B"
 print("Loading Med42 model...")
 med42_model = None
 tokenizer = None
@@ -75,7 +82,7 @@ try:
     )
 
     # Load model and tokenizer separately
-    model_name_or_path = "m42-health/Llama3-Med42-8B"
+    model_name_or_path = MED42_MODEL_NAME
     tokenizer = AutoTokenizer.from_pretrained(model_name_or_path)
     
     # Load the model with quantization config
@@ -101,10 +108,17 @@ except Exception as e:
     tokenizer = None
     pipeline = None
 
+# Bump whenever the explanation prompt or sampling settings change, so cached answers are regenerated
+EXPLANATION_PROMPT_VERSION = 1
+
 def get_condition_explanation(condition):
-    """Get detailed explanation of the condition using Med42 model"""
+    """Get detailed explanation of the condition (served from the explanation cache)"""
+    return explanation_cache.get(condition)
+
+def generate_condition_explanation(condition):
+    """Generate an explanation of the condition with the Med42 model, or None if it is unavailable"""
     if pipeline is None:
-        return VOICE_CONDITIONS.get(condition.lower(), "Description not available")
+        return None
         
     try:
         messages = [
@@ -140,11 +154,11 @@ def get_condition_explanation(condition):
 
         # Extract the generated text
         explanation = outputs[0]["generated_text"][len(prompt):].strip()
-        return explanation if explanation else VOICE_CONDITIONS.get(condition.lower(), "Description not available")
+        return explanation if explanation else None
             
     except Exception as e:
         print(f"Error getting explanation: {str(e)}")
-        return VOICE_CONDITIONS.get(condition.lower(), "Description not available")
+        return None
 
 # Define voice conditions and their descriptions
 VOICE_CONDITIONS = {
@@ -162,72 +176,534 @@ LABEL_MAPPING = {
     3: 'reflux laryngitis'
 }
 
-def convert_audio_to_wav(file_data, file_format):
-    """Convert audio file to WAV format"""
+# Explanation cache settings
+EXPLANATION_CACHE_PATH = os.getenv("EXPLANATION_CACHE_PATH", "explanation_cache.json")
+EXPLANATION_TTL_SECONDS = int(os.getenv("EXPLANATION_TTL_SECONDS", str(7 * 24 * 3600)))  # regenerate weekly
+EXPLANATION_REFRESH_INTERVAL = 3600  # seconds between checks for expired explanations
+
+class ExplanationCache:
+    """Med42 condition explanations cached in memory and on disk
+
+    Entries are keyed by (condition, prompt version, model), so changing the prompt or the
+    model never serves old text. Lookups never wait for the model: a missing explanation
+    falls back to the short VOICE_CONDITIONS description and an expired one is served
+    while a background worker regenerates it. All labels are generated at startup and the
+    cache file survives restarts.
+    
+    Generation runs on a single worker thread: there is one Med42 pipeline on one GPU, so
+    generations are serialized anyway and more threads would only wait on each other.
+    """
+    
+    def __init__(self, path, ttl_seconds):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.entries = {}
+        self.cache_lock = threading.Lock()
+        self.save_lock = threading.Lock()  # one writer of the cache file at a time
+        self.executor = ThreadPoolExecutor(max_workers=1)  # the only caller of refresh()
+        self.pending = {}  # condition -> Future of its running generation
+        self.refresher_thread = None
+        self.generated = 0
+        self.load()
+    
+    def key(self, condition):
+        return f"{condition.lower()}|v{EXPLANATION_PROMPT_VERSION}|{MED42_MODEL_NAME}"
+    
+    def load(self):
+        """Load explanations saved by earlier runs"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+            print(f"Loaded {len(self.entries)} cached explanations from {self.path}")
+        except Exception as e:
+            print(f"Error loading explanation cache: {str(e)}")
+            self.entries = {}
+    
+    def save(self):
+        """Write the cache atomically so a crash never leaves a truncated file"""
+        with self.save_lock:
+            with self.cache_lock:
+                entries = dict(self.entries)
+            try:
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, 'w') as f:
+                    json.dump(entries, f, indent=2)
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                print(f"Error saving explanation cache: {str(e)}")
+    
+    def is_expired(self, entry):
+        return datetime.now().timestamp() - entry["created"] > self.ttl_seconds
+    
+    def lookup(self, condition):
+        """Cached explanation or None; an expired one is still returned and regenerated in the background"""
+        with self.cache_lock:
+            entry = self.entries.get(self.key(condition))
+        
+        if entry is None:
+            return None
+        if self.is_expired(entry):
+            self.refresh_async(condition)
+        return entry["explanation"]
+    
+    def get(self, condition):
+        """Cached explanation; schedules generation in the background when missing or expired"""
+        explanation = self.lookup(condition)
+        if explanation is None:
+            self.refresh_async(condition)
+            return VOICE_CONDITIONS.get(condition.lower(), "Description not available")
+        return explanation
+    
+    def refresh(self, condition):
+        """Generate and store a fresh explanation (keeps the old one if generation fails)
+
+        Runs on the generation worker; use refresh_async() from anywhere else.
+        """
+        explanation = generate_condition_explanation(condition)
+        if explanation is None:
+            return False
+        
+        with self.cache_lock:
+            self.entries[self.key(condition)] = {
+                "condition": condition,
+                "explanation": explanation,
+                "created": datetime.now().timestamp()
+            }
+            self.generated += 1
+        self.save()
+        return True
+    
+    def refresh_async(self, condition):
+        """Regenerate an explanation on the generation worker, once per condition at a time
+
+        Returns the Future of the running generation (shared by every caller asking for the
+        same condition meanwhile), or None if Med42 is not loaded.
+        """
+        if pipeline is None:
+            return None
+        with self.cache_lock:
+            future = self.pending.get(condition)
+            if future is not None:
+                return future
+            future = self.executor.submit(self.refresh, condition)
+            self.pending[condition] = future
+        
+        # Added outside the lock: the callback runs right away if the generation already finished
+        future.add_done_callback(lambda _: self.generation_done(condition, future))
+        return future
+    
+    def generation_done(self, condition, future):
+        with self.cache_lock:
+            if self.pending.get(condition) is future:
+                del self.pending[condition]
+    
+    def refresher(self, conditions):
+        """Warm every condition at startup, then regenerate expired ones periodically"""
+        while True:
+            for condition in conditions:
+                with self.cache_lock:
+                    entry = self.entries.get(self.key(condition))
+                if entry is None or self.is_expired(entry):
+                    # Through the generation worker, so a request asking meanwhile shares this generation
+                    future = self.refresh_async(condition)
+                    if future is not None:
+                        future.result()
+            threading.Event().wait(EXPLANATION_REFRESH_INTERVAL)
+    
+    def start(self, conditions):
+        """Start the background warm-up/refresh thread if it is not already running"""
+        if pipeline is None:
+            return
+        if self.refresher_thread is None or not self.refresher_thread.is_alive():
+            self.refresher_thread = threading.Thread(target=self.refresher, args=(list(conditions),), daemon=True)
+            self.refresher_thread.start()
+    
+    def stats(self):
+        with self.cache_lock:
+            return {
+                "entries": len(self.entries),
+                "generated": self.generated,
+                "pending": len(self.pending),
+                "prompt_version": EXPLANATION_PROMPT_VERSION,
+                "ttl_seconds": self.ttl_seconds
+            }
+
+# Warm the explanation of every known label in the background
+explanation_cache = ExplanationCache(EXPLANATION_CACHE_PATH, EXPLANATION_TTL_SECONDS)
+known_conditions = set(LABEL_MAPPING.values())
+if label_encoder is not None:
+    known_conditions.update(str(class_name) for class_name in label_encoder.classes_)
+explanation_cache.start(sorted(known_conditions))
+
+# Explanation job settings
+EXPLANATION_DEADLINE_SECONDS = float(os.getenv("EXPLANATION_DEADLINE_SECONDS", "30"))
+EXPLANATION_MAX_DEADLINE_SECONDS = 300  # upper bound for a per-request deadline
+EXPLANATION_JOB_RETENTION = 900  # seconds a job stays available after it was created
+SSE_KEEPALIVE_SECONDS = 15
+
+class ExplanationJobs:
+    """Detailed explanations that /predict hands out as jobs instead of waiting for Med42
+
+    A job is finished at once when the explanation is cached. Otherwise it waits for the
+    generation queued on the cache's generation worker (jobs for the same condition share one
+    generation); a job still waiting at its deadline is finished with the short
+    VOICE_CONDITIONS description. Results are polled from /predict/<job_id> or streamed
+    from /predict/<job_id>/events.
+    """
+    
+    def __init__(self, deadline_seconds, retention_seconds):
+        self.deadline_seconds = deadline_seconds
+        self.retention_seconds = retention_seconds
+        self.jobs = {}
+        self.events = {}  # job ID -> Event set when the job is finished
+        self.lock = threading.Lock()
+        self.counts = {"cache": 0, "generated": 0, "fallback": 0, "deadline": 0}
+    
+    def submit(self, condition, deadline_seconds=None):
+        """Start an explanation job for a condition and return it"""
+        now = time.time()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "condition": condition,
+            "status": "pending",
+            "source": None,
+            "explanation": None,
+            "created": now,
+            "deadline": now + (deadline_seconds or self.deadline_seconds),
+            "finished": None
+        }
+        with self.lock:
+            self.prune(now)
+            self.jobs[job["job_id"]] = job
+            self.events[job["job_id"]] = threading.Event()
+        
+        explanation = explanation_cache.lookup(condition)
+        future = None if explanation is not None else explanation_cache.refresh_async(condition)
+        if explanation is not None:
+            self.finish(job, explanation, "cache")
+        elif future is None:
+            self.finish(job, None, "fallback")  # Med42 not loaded
+        else:
+            future.add_done_callback(lambda _: self.generated(job))
+        return job
+    
+    def generated(self, job):
+        """Called when the generation a job waits for has finished (or failed)"""
+        explanation = explanation_cache.lookup(job["condition"])
+        self.finish(job, explanation, "generated" if explanation is not None else "fallback")
+    
+    def finish(self, job, explanation, source):
+        """Complete a job once; a missing explanation becomes the VOICE_CONDITIONS description"""
+        with self.lock:
+            if job["status"] != "pending":
+                return
+            if explanation is None:
+                explanation = VOICE_CONDITIONS.get(job["condition"].lower(), "Description not available")
+            job["status"] = "done"
+            job["source"] = source
+            job["explanation"] = explanation
+            job["finished"] = time.time()
+            self.counts[source] += 1
+            event = self.events.get(job["job_id"])
+        if event is not None:
+            event.set()
+    
+    def get(self, job_id):
+        """Job by ID (finished with the fallback if its deadline has passed), or None"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is not None and job["status"] == "pending" and time.time() >= job["deadline"]:
+            self.finish(job, None, "deadline")
+        return job
+    
+    def wait(self, job_id, timeout):
+        """Wait up to timeout seconds (never past the job's deadline) and return the job"""
+        job = self.get(job_id)
+        if job is None or job["status"] != "pending":
+            return job
+        with self.lock:
+            event = self.events.get(job_id)
+        if event is not None:
+            event.wait(max(0.0, min(timeout, job["deadline"] - time.time())))
+        return self.get(job_id)
+    
+    def prune(self, now):
+        """Forget jobs older than the retention period (called with the lock held)"""
+        expired = [job_id for job_id, job in self.jobs.items() if now - job["created"] > self.retention_seconds]
+        for job_id in expired:
+            del self.jobs[job_id]
+            del self.events[job_id]
+    
+    def describe(self, job):
+        """JSON-friendly view of a job"""
+        return {
+            "job_id": job["job_id"],
+            "condition": job["condition"],
+            "status": job["status"],
+            "source": job["source"],
+            "detailed_explanation": job["explanation"],
+            "created": datetime.fromtimestamp(job["created"]).isoformat(),
+            "deadline": datetime.fromtimestamp(job["deadline"]).isoformat(),
+            "elapsed": round((job["finished"] or time.time()) - job["created"], 3)
+        }
+    
+    def stats(self):
+        with self.lock:
+            pending = sum(1 for job in self.jobs.values() if job["status"] == "pending")
+            return {
+                "jobs": len(self.jobs),
+                "pending": pending,
+                "finished_by_source": dict(self.counts),
+                "deadline_seconds": self.deadline_seconds
+            }
+
+explanation_jobs = ExplanationJobs(EXPLANATION_DEADLINE_SECONDS, EXPLANATION_JOB_RETENTION)
+
+# Batch prediction limits
+BATCH_MAX_FILES = 500
+BATCH_MAX_BYTES = 500 * 1024 * 1024  # total (uncompressed) upload size
+BATCH_DECODE_WORKERS = min(16, (os.cpu_count() or 1) * 2)  # decoding mostly waits on ffmpeg
+
+# Formats libsndfile decodes straight from memory; everything else goes through ffmpeg
+SOUNDFILE_FORMATS = {"wav", "flac", "ogg", "oga", "aiff", "aif", "aifc", "au", "caf", "w64", "rf64", "mp3"}
+# Containers ffmpeg may not be able to read from a pipe (index stored at the end of the file)
+SEEKABLE_FORMATS = {"m4a", "mp4", "mov", "3gp"}
+FFMPEG_TIMEOUT = 60  # seconds
+
+# Recordings longer than this are analysed block by block with bounded memory
+STREAMING_MIN_SAMPLES = 8 * 1024 * 1024  # decoded samples (all channels), 32 MB as float32
+STREAM_BLOCK_SAMPLES = 65536
+QUANTILE_SKETCH_BINS = 65536  # histogram bins over [-1, 1]; quantile error <= 2 / bins
+
+def ffmpeg_command(source, use_stdin):
+    """ffmpeg arguments that decode source ('pipe:0' or a path) to mono float32 PCM on stdout"""
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error"]
+    if not use_stdin:
+        command.append("-nostdin")
+    # -rematrix_maxval 1.0 makes the -ac 1 downmix the plain channel mean (as the soundfile path
+    # does) instead of ffmpeg's default 0.707 * (L + R)
+    return command + ["-i", source, "-f", "f32le", "-acodec", "pcm_f32le", "-ac", "1", "-rematrix_maxval", "1.0",
+                      "pipe:1"]
+
+def run_ffmpeg(source, file_data=None):
+    """Decode with ffmpeg to mono float32 PCM on stdout; source is 'pipe:0' or a file path"""
+    command = ffmpeg_command(source, file_data is not None)
+    result = subprocess.run(command, input=file_data, capture_output=True, timeout=FFMPEG_TIMEOUT)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode the audio: {result.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+def decode_with_ffmpeg(file_data, file_format):
+    """Pipe the upload through ffmpeg's stdin/stdout; no temporary files in the common case"""
+    try:
+        return run_ffmpeg("pipe:0", file_data)
+    except RuntimeError:
+        if file_format not in SEEKABLE_FORMATS:
+            raise
+    
+    # MP4-style files with the index at the end need a seekable input
+    with tempfile.NamedTemporaryFile(suffix=f'.{file_format}') as temp_in:
+        temp_in.write(file_data)
+        temp_in.flush()
+        return run_ffmpeg(temp_in.name)
+
+def decode_audio(file_data, file_format=None):
+    """Decode an upload to a mono float32 array in [-1, 1], entirely in memory"""
+    file_format = (file_format or 'wav').lower()
+    
+    if file_format == 'dat':
+        # Raw int16 samples, normalized in place after the one conversion copy
+        audio_data = np.frombuffer(file_data, dtype=np.int16).astype(np.float32)
+        np.divide(audio_data, np.iinfo(np.int16).max, out=audio_data)
+        return audio_data
+    
+    if file_format in SOUNDFILE_FORMATS:
+        try:
+            audio_data, _ = sf.read(io.BytesIO(file_data), dtype='float32', always_2d=False)
+            # If stereo, convert to mono by averaging channels
+            if audio_data.ndim > 1:
+                audio_data = audio_data.mean(axis=1, dtype=np.float32)
+            return audio_data
+        except RuntimeError as e:
+            # e.g. an MP3 on an older libsndfile; let ffmpeg try
+            print(f"soundfile could not decode {file_format}, falling back to ffmpeg: {str(e)}")
+    
+    return decode_with_ffmpeg(file_data, file_format)
+
+def feed_stdin(pipe, file_data):
+    """Write an upload to a subprocess' stdin (run in a thread so stdout can be drained meanwhile)"""
     try:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(suffix=f'.{file_format}', delete=False) as temp_in:
+        pipe.write(file_data)
+    except BrokenPipeError:
+        pass  # ffmpeg exited early; its error is reported from stderr
+    finally:
+        pipe.close()
+
+def read_ffmpeg_blocks(source, file_data, block_samples):
+    """Yield float32 blocks from ffmpeg's stdout as they are decoded"""
+    process = subprocess.Popen(
+        ffmpeg_command(source, file_data is not None),
+        stdin=subprocess.PIPE if file_data is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if file_data is not None:
+        threading.Thread(target=feed_stdin, args=(process.stdin, file_data), daemon=True).start()
+    try:
+        while True:
+            chunk = process.stdout.read(block_samples * 4)
+            if not chunk:
+                break
+            yield np.frombuffer(chunk, dtype=np.float32, count=len(chunk) // 4)
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        stderr = process.stderr.read()
+        process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode the audio: {stderr.decode(errors='replace').strip()}")
+
+def iter_audio_blocks(file_data, file_format=None, block_samples=STREAM_BLOCK_SAMPLES):
+    """Decode an upload as a stream of mono float32 blocks in [-1, 1]"""
+    file_format = (file_format or 'wav').lower()
+    
+    if file_format == 'dat':
+        # Convert one block of raw int16 samples at a time
+        total = len(file_data) // 2
+        for start in range(0, total, block_samples):
+            block = np.frombuffer(file_data, dtype=np.int16, count=min(block_samples, total - start),
+                                  offset=start * 2).astype(np.float32)
+            np.divide(block, np.iinfo(np.int16).max, out=block)
+            yield block
+        return
+    
+    if file_format in SOUNDFILE_FORMATS:
+        try:
+            sound_file = sf.SoundFile(io.BytesIO(file_data))
+        except RuntimeError as e:
+            print(f"soundfile could not decode {file_format}, falling back to ffmpeg: {str(e)}")
+        else:
+            with sound_file:
+                for block in sound_file.blocks(block_samples, dtype='float32', always_2d=True):
+                    yield block.mean(axis=1, dtype=np.float32) if block.shape[1] > 1 else block[:, 0]
+            return
+    
+    if file_format in SEEKABLE_FORMATS:
+        # MP4-style files may keep their index at the end, so ffmpeg gets a seekable file
+        with tempfile.NamedTemporaryFile(suffix=f'.{file_format}') as temp_in:
             temp_in.write(file_data)
-            temp_in_path = temp_in.name
+            temp_in.flush()
+            yield from read_ffmpeg_blocks(temp_in.name, None, block_samples)
+    else:
+        yield from read_ffmpeg_blocks("pipe:0", file_data, block_samples)
+
+class StreamingFeatures:
+    """Running versions of the read_audio_file features, updated one block at a time
+
+    Mean, standard deviation (merged per block in float64), min, max and the absolute
+    sum are exact. The median and quartiles come from a fixed histogram over [-1, 1], so
+    memory does not grow with the recording and their error is at most one bin width
+    (2 / QUANTILE_SKETCH_BINS, about 3e-5 by default).
+    """
+    
+    def __init__(self, bins=QUANTILE_SKETCH_BINS):
+        self.bins = bins
+        self.histogram = np.zeros(bins, dtype=np.int64)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared differences from the mean
+        self.abs_sum = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+    
+    def update(self, block):
+        """Add a block of samples"""
+        if len(block) == 0:
+            return
+        block_count = len(block)
+        block_mean = float(block.mean(dtype=np.float64))
+        block_m2 = float(np.square(block - block_mean, dtype=np.float64).sum())
         
-        # Convert to WAV using pydub
-        if file_format.lower() == 'dat':
-            # For .dat files, use the existing function
-            return file_data
-        else:
-            try:
-                # Try to load with pydub
-                audio = AudioSegment.from_file(temp_in_path, format=file_format)
-                
-                # Export as WAV to a temporary file
-                with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_out:
-                    temp_out_path = temp_out.name
-                
-                audio.export(temp_out_path, format="wav")
-                
-                # Read the WAV file
-                with open(temp_out_path, 'rb') as f:
-                    wav_data = f.read()
-                
-                # Clean up temporary files
-                os.remove(temp_in_path)
-                os.remove(temp_out_path)
-                
-                return wav_data
-            
-            except Exception as e:
-                print(f"Error converting with pydub: {str(e)}")
-                # Clean up temporary file
-                os.remove(temp_in_path)
-                raise e
+        # Chan et al. parallel merge of (count, mean, M2)
+        total = self.count + block_count
+        delta = block_mean - self.mean
+        self.mean += delta * block_count / total
+        self.m2 += block_m2 + delta * delta * self.count * block_count / total
+        self.count = total
+        
+        self.abs_sum += float(np.abs(block).sum(dtype=np.float64))
+        self.min = min(self.min, float(block.min()))
+        self.max = max(self.max, float(block.max()))
+        
+        # Samples outside [-1, 1] land in the edge bins
+        indices = ((block + 1.0) * (self.bins / 2)).astype(np.int64)
+        np.clip(indices, 0, self.bins - 1, out=indices)
+        self.histogram += np.bincount(indices, minlength=self.bins)
     
-    except Exception as e:
-        print(f"Error in audio conversion: {str(e)}")
-        raise e
+    def quantile(self, q):
+        """Estimate the q-th quantile (0-1) the way np.percentile interpolates ranks"""
+        rank = q * (self.count - 1)
+        cumulative = np.cumsum(self.histogram)
+        index = int(np.searchsorted(cumulative, rank, side='right'))
+        before = cumulative[index - 1] if index > 0 else 0
+        # Assume the samples of a bin are spread evenly across it
+        width = 2.0 / self.bins
+        value = -1.0 + width * (index + (rank - before + 0.5) / self.histogram[index])
+        return float(min(max(value, self.min), self.max))
+    
+    def features(self):
+        """Features in the same order as read_audio_file"""
+        return [
+            self.mean,
+            float(np.sqrt(self.m2 / self.count)),
+            self.max,
+            self.min,
+            self.quantile(0.5),
+            self.quantile(0.25),
+            self.quantile(0.75),
+            self.abs_sum,
+            self.abs_sum / self.count,
+            self.count
+        ]
+
+def read_audio_file_streaming(file_data, file_format=None):
+    """Extract the read_audio_file features block by block with constant memory"""
+    stats = StreamingFeatures()
+    for block in iter_audio_blocks(file_data, file_format):
+        stats.update(block)
+    if stats.count == 0:
+        raise ValueError("The audio file contains no samples")
+    return stats.features()
+
+def decoded_sample_count(file_data, file_format=None):
+    """Samples (all channels) the upload decodes to, or None if that is unknown without decoding"""
+    file_format = (file_format or 'wav').lower()
+    if file_format == 'dat':
+        return len(file_data) // 2
+    if file_format in SOUNDFILE_FORMATS:
+        try:
+            info = sf.info(io.BytesIO(file_data))
+            return info.frames * info.channels
+        except RuntimeError:
+            return None  # decoded by ffmpeg instead
+    return None
 
 def read_audio_file(file_data, file_format=None):
     """Read audio file and extract features for prediction"""
     try:
-        # If it's a .dat file, use the existing function
-        if file_format and file_format.lower() == 'dat':
-            # Convert binary data to numpy array of int16
-            audio_data = np.frombuffer(file_data, dtype=np.int16)
-        else:
-            # For other formats, convert to WAV first if needed
-            if file_format and file_format.lower() != 'wav':
-                file_data = convert_audio_to_wav(file_data, file_format)
-            
-            # Load audio data using soundfile
-            audio_data, _ = sf.read(io.BytesIO(file_data))
-            
-            # If stereo, convert to mono by averaging channels
-            if len(audio_data.shape) > 1 and audio_data.shape[1] > 1:
-                audio_data = np.mean(audio_data, axis=1)
+        # Long recordings are streamed instead of being decoded into one array. The decoded
+        # length decides, not the upload size: compressed audio is many times smaller than
+        # its samples. Formats only ffmpeg can read are always streamed.
+        sample_count = decoded_sample_count(file_data, file_format)
+        if sample_count is None or sample_count > STREAMING_MIN_SAMPLES:
+            return read_audio_file_streaming(file_data, file_format)
         
-        # Convert to float32 and normalize if not already
-        if audio_data.dtype != np.float32:
-            max_val = np.iinfo(audio_data.dtype).max if np.issubdtype(audio_data.dtype, np.integer) else 1.0
-            audio_data = audio_data.astype(np.float32) / max_val
+        # Decode straight to a normalized mono float32 array
+        audio_data = decode_audio(file_data, file_format)
+        if len(audio_data) == 0:
+            raise ValueError("The audio file contains no samples")
         
         # Extract simple statistical features
         features = [
@@ -249,8 +725,39 @@ def read_audio_file(file_data, file_format=None):
         print(f"Error processing audio file: {str(e)}")
         raise e
 
-def predict_voice_condition(file_data, file_format=None):
-    """Predict voice condition from audio file"""
+def classify_features(feature_rows):
+    """Predict the condition and confidence (%) of every feature row with one predict_proba call"""
+    features = np.array(feature_rows, dtype=np.float64).reshape(len(feature_rows), -1)
+    probabilities = voice_model.predict_proba(features)
+    
+    # The argmax of the probabilities is what predict() would return, so it isn't called separately
+    best = np.argmax(probabilities, axis=1)
+    predicted_classes = label_encoder.inverse_transform(voice_model.classes_[best])
+    confidences = probabilities[np.arange(len(best)), best] * 100
+    return [(str(predicted_class), float(confidence)) for predicted_class, confidence in zip(predicted_classes, confidences)]
+
+def build_prediction(predicted_class, class_probability, detailed_explanation):
+    """Structured prediction response for one recording"""
+    return {
+        "success": True,
+        "prediction": {
+            "condition": predicted_class,
+            "confidence": class_probability,
+            "severity": "High" if class_probability > 90 else "Medium" if class_probability > 70 else "Low",
+        },
+        "medical_info": {
+            "brief_description": VOICE_CONDITIONS.get(predicted_class.lower(), "Description not available"),
+            "detailed_explanation": detailed_explanation,
+            "recommendation": "Please consult with a healthcare professional for a complete evaluation and treatment plan."
+        }
+    }
+
+def predict_voice_condition(file_data, file_format=None, deadline_seconds=None):
+    """Predict voice condition from audio file
+
+    The classification is returned right away; the detailed explanation comes from an
+    explanation job (the short description stands in until the job has finished).
+    """
     if voice_model is None or label_encoder is None:
         return {
             "success": False,
@@ -260,39 +767,103 @@ def predict_voice_condition(file_data, file_format=None):
     try:
         # Extract features
         features = read_audio_file(file_data, file_format)
-        features = np.array(features).reshape(1, -1)
-        
-        # Make prediction
-        prediction = voice_model.predict(features)
-        probabilities = voice_model.predict_proba(features)
         
         # Get predicted class and probability
-        predicted_class = label_encoder.inverse_transform(prediction)[0]
-        class_probability = float(max(probabilities[0]) * 100)  # Convert to float for JSON serialization
+        predicted_class, class_probability = classify_features([features])[0]
         
-        # Get detailed explanation
-        detailed_explanation = get_condition_explanation(predicted_class)
+        # Start the explanation job; it is already finished when the explanation is cached
+        job = explanation_jobs.submit(predicted_class, deadline_seconds)
+        detailed_explanation = job["explanation"] or VOICE_CONDITIONS.get(predicted_class.lower(), "Description not available")
         
         # Create a more structured response
-        return {
-            "success": True,
-            "prediction": {
-                "condition": predicted_class,
-                "confidence": class_probability,
-                "severity": "High" if class_probability > 90 else "Medium" if class_probability > 70 else "Low",
-            },
-            "medical_info": {
-                "brief_description": VOICE_CONDITIONS.get(predicted_class.lower(), "Description not available"),
-                "detailed_explanation": detailed_explanation,
-                "recommendation": "Please consult with a healthcare professional for a complete evaluation and treatment plan."
-            }
+        result = build_prediction(predicted_class, class_probability, detailed_explanation)
+        result["explanation_job"] = {
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "status_url": f"/predict/{job['job_id']}",
+            "events_url": f"/predict/{job['job_id']}/events"
         }
+        return result
     except Exception as e:
         return {
             "success": False,
             "error": str(e)
         }
 
+def extract_batch_features(item):
+    """Features of one (filename, file_data) batch item, or the error it raised"""
+    filename, file_data = item
+    try:
+        file_format = filename.split('.')[-1].lower()
+        return read_audio_file(file_data, file_format), None
+    except Exception as e:
+        return None, str(e)
+
+def predict_voice_conditions(items):
+    """Predict many recordings at once; results are in the same order as items
+
+    Files are decoded in parallel, all feature rows go through the model in one call,
+    and the explanation is generated once per distinct condition.
+    """
+    if voice_model is None or label_encoder is None:
+        return {
+            "success": False,
+            "error": "Voice model or label encoder not loaded properly"
+        }
+    
+    # Decode and extract features in parallel (map keeps the input order)
+    with ThreadPoolExecutor(max_workers=BATCH_DECODE_WORKERS) as executor:
+        extracted = list(executor.map(extract_batch_features, items))
+    
+    decoded = [index for index, (features, _) in enumerate(extracted) if features is not None]
+    predictions = classify_features([extracted[index][0] for index in decoded]) if decoded else []
+    
+    explanations = {}
+    results = [None] * len(items)
+    for index, (predicted_class, class_probability) in zip(decoded, predictions):
+        if predicted_class not in explanations:
+            explanations[predicted_class] = get_condition_explanation(predicted_class)
+        results[index] = build_prediction(predicted_class, class_probability, explanations[predicted_class])
+    
+    for index, (filename, _) in enumerate(items):
+        if results[index] is None:
+            results[index] = {"success": False, "error": extracted[index][1]}
+        results[index]["filename"] = filename
+    
+    return {
+        "success": True,
+        "count": len(results),
+        "failed": len(results) - len(decoded),
+        "results": results
+    }
+
+def read_batch_upload(files):
+    """(filename, file_data) for every uploaded file, expanding .zip archives in place"""
+    items = []
+    total_bytes = 0
+    for file in files:
+        if file.filename == '':
+            continue
+        file_data = file.read()
+        if not file.filename.lower().endswith('.zip'):
+            total_bytes += len(file_data)
+            if total_bytes > BATCH_MAX_BYTES:
+                raise ValueError(f"Upload exceeds {BATCH_MAX_BYTES // (1024 * 1024)} MB")
+            items.append((file.filename, file_data))
+            continue
+        
+        with zipfile.ZipFile(io.BytesIO(file_data)) as archive:
+            for info in archive.infolist():
+                # Skip folders and macOS resource forks
+                if info.is_dir() or info.filename.startswith('__MACOSX/') or os.path.basename(info.filename).startswith('.'):
+                    continue
+                # Check the declared size before inflating anything
+                total_bytes += info.file_size
+                if total_bytes > BATCH_MAX_BYTES:
+                    raise ValueError(f"Upload exceeds {BATCH_MAX_BYTES // (1024 * 1024)} MB")
+                items.append((info.filename, archive.read(info)))
+    return items
+
 class HealthNewsManager:
     """Class to manage health news fetching, processing, and caching"""
     
@@ -511,6 +1082,13 @@ def latest_health_news():
             "error": str(e)
         })
         
+def parse_seconds(value):
+    """Float number of seconds from a request parameter; ValueError unless it is finite"""
+    seconds = float(value)
+    if not math.isfinite(seconds):
+        raise ValueError(f"{value} is not a finite number of seconds")
+    return seconds
+
 @app.route('/predict', methods=['POST'])
 def predict():
     try:
@@ -536,8 +1114,19 @@ def predict():
         # Read file data
         file_data = file.read()
         
+        # Optional deadline for the explanation job, in seconds
+        deadline_seconds = request.form.get('deadline', request.args.get('deadline'))
+        if deadline_seconds is not None:
+            try:
+                deadline_seconds = min(max(parse_seconds(deadline_seconds), 0.1), EXPLANATION_MAX_DEADLINE_SECONDS)
+            except ValueError:
+                return jsonify({
+                    "success": False,
+                    "error": "deadline must be a number of seconds"
+                }), 400
+        
         # Make prediction
-        result = predict_voice_condition(file_data, file_format)
+        result = predict_voice_condition(file_data, file_format, deadline_seconds)
         
         return jsonify(result)
 
@@ -547,6 +1136,82 @@ def predict():
             "error": str(e)
         })
 
+@app.route('/predict/<job_id>', methods=['GET'])
+def explanation_job_status(job_id):
+    """Poll an explanation job; ?wait=N holds the request up to N seconds for it to finish"""
+    try:
+        wait_seconds = min(parse_seconds(request.args.get('wait', 0)), EXPLANATION_MAX_DEADLINE_SECONDS)
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "error": "wait must be a number of seconds"
+        }), 400
+    job = explanation_jobs.wait(job_id, wait_seconds) if wait_seconds > 0 else explanation_jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            "success": False,
+            "error": "Unknown or expired job ID"
+        }), 404
+    
+    return jsonify({
+        "success": True,
+        "job": explanation_jobs.describe(job)
+    })
+
+@app.route('/predict/<job_id>/events', methods=['GET'])
+def explanation_job_events(job_id):
+    """Server-sent events: one 'explanation' event when the job finishes, keepalives until then"""
+    if explanation_jobs.get(job_id) is None:
+        return jsonify({
+            "success": False,
+            "error": "Unknown or expired job ID"
+        }), 404
+    
+    def generate_events():
+        while True:
+            job = explanation_jobs.wait(job_id, SSE_KEEPALIVE_SECONDS)
+            if job is None:
+                yield f"event: error\ndata: {json.dumps({'error': 'Unknown or expired job ID'})}\n\n"
+                return
+            if job["status"] != "pending":
+                yield f"event: explanation\ndata: {json.dumps(explanation_jobs.describe(job))}\n\n"
+                return
+            yield ": keepalive\n\n"
+    
+    return Response(generate_events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Predict many recordings in one request (multipart 'files' and/or .zip archives)"""
+    try:
+        files = request.files.getlist('files') + request.files.getlist('file')
+        if not files:
+            return jsonify({
+                "success": False,
+                "error": "No files uploaded"
+            })
+        
+        items = read_batch_upload(files)
+        if not items:
+            return jsonify({
+                "success": False,
+                "error": "No audio files found in the upload"
+            })
+        if len(items) > BATCH_MAX_FILES:
+            return jsonify({
+                "success": False,
+                "error": f"Too many files ({len(items)}); the limit is {BATCH_MAX_FILES} per request"
+            })
+        
+        return jsonify(predict_voice_conditions(items))
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        })
+
 @app.route('/classes', methods=['GET'])
 def get_classes():
     """Return all available voice condition classes and their descriptions"""
@@ -581,6 +1246,8 @@ def health_check():
         "model_loaded": voice_model is not None,
         "label_encoder_loaded": label_encoder is not None,
         "med42_loaded": med42_model is not None,
+        "explanation_cache": explanation_cache.stats(),
+        "explanation_jobs": explanation_jobs.stats(),
         "ngrok_url": public_url,
         "supported_formats": ["wav", "mp3", "ogg", "flac", "m4a", "dat"]
     })
@@ -616,6 +1283,19 @@ def index():
             <h3>POST /predict</h3>
             <p>Upload an audio file to get voice condition prediction.</p>
             <p>Example: <code>curl -F "file=@sample.mp3" """ + public_url + """/predict</code></p>
+            <p>The classification is returned immediately with an <code>explanation_job</code>; an optional <code>deadline</code> field (seconds) limits how long the detailed explanation may take.</p>
+        </div>
+        
+        <div class="endpoint">
+            <h3>GET /predict/&lt;job_id&gt;</h3>
+            <p>Poll the detailed explanation of a prediction (<code>?wait=10</code> waits up to 10 seconds for it). Use <code>/predict/&lt;job_id&gt;/events</code> to receive it as a server-sent event.</p>
+            <p>Example: <code>curl """ + public_url + """/predict/JOB_ID?wait=10</code></p>
+        </div>
+        
+        <div class="endpoint">
+            <h3>POST /predict/batch</h3>
+            <p>Upload many audio files (or .zip archives of them) at once. Results keep the upload order.</p>
+            <p>Example: <code>curl -F "files=@a.wav" -F "files=@b.mp3" -F "files=@more.zip" """ + public_url + """/predict/batch</code></p>
         </div>
         
         <div class="endpoint">